@@ -0,0 +1 @@
+"""Бенчмарки бота. Запуск: python -m benchmarks.<имя_модуля>"""
@@ -0,0 +1,93 @@
+"""Нагрузочный тест обработки обновлений: последовательно против ChatOrderedDispatcher
+
+Синтетические обновления прогоняются через настоящие хендлеры main.py,
+Telegram API заменен заглушкой с задержкой --api-latency-ms на вызов.
+
+    python -m benchmarks.bench_dispatch --users 50 --messages 20 --workers 1,4,16
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks.common import percentile, use_temp_database
+
+use_temp_database('bench_dispatch')
+os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+# Ответы отправляются синхронно из хендлера: задержка API на пути обработки, которую и распараллеливает диспетчер
+os.environ.setdefault('SEND_WORKERS', '0')
+
+from benchmarks.fake_api import StubTelegramApi, make_update  # noqa: E402
+import main  # noqa: E402
+import migrations  # noqa: E402
+from dispatcher import ChatOrderedDispatcher  # noqa: E402
+
+
+def build_updates(users, messages, base_user_id):
+    """Сессии пользователей: /start, затем ответы и "Дальше" вперемешку между чатами"""
+    sessions = []
+    for user_id in range(base_user_id, base_user_id + users):
+        texts = ['/start'] + [
+            main.Command.NEXT if i % 3 == 2 else random.choice(['red', 'green', 'blue', 'cat'])
+            for i in range(messages - 1)
+        ]
+        sessions.append((user_id, texts))
+
+    updates = []
+    for step in range(messages):
+        for user_id, texts in sessions:
+            updates.append(make_update(user_id, texts[step]))
+    return updates
+
+
+def run_sequential(updates):
+    latencies = []
+    started = time.perf_counter()
+    for update in updates:
+        update_started = time.perf_counter()
+        main.bot.process_new_updates([update])
+        latencies.append((time.perf_counter() - update_started) * 1000)
+    elapsed = time.perf_counter() - started
+    return elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def run_dispatcher(updates, workers):
+    dispatcher = ChatOrderedDispatcher(main.bot, workers=workers, queue_size=len(updates))
+    dispatcher.start()
+    started = time.perf_counter()
+    main.bot.process_new_updates(updates)
+    while dispatcher.stats()['processed'] < len(updates):
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    stats = dispatcher.stats()
+    dispatcher.stop()
+    return elapsed, stats['p50_ms'], stats['p99_ms']
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20, help='сообщений на пользователя')
+    parser.add_argument('--workers', default='1,4,8,16')
+    parser.add_argument('--api-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    migrations.upgrade(main.db)
+    api = StubTelegramApi(latency=args.api_latency_ms / 1000).install()
+
+    print(f"{'mode':<14} {'updates':>8} {'upd/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    modes = [('sequential', None)] + [(f'dispatch x{w}', int(w)) for w in args.workers.split(',')]
+    for index, (name, workers) in enumerate(modes):
+        updates = build_updates(args.users, args.messages, base_user_id=1_000_000 * (index + 1))
+        if workers is None:
+            elapsed, p50, p99 = run_sequential(updates)
+        else:
+            elapsed, p50, p99 = run_dispatcher(updates, workers)
+        print(f"{name:<14} {len(updates):>8} {len(updates) / elapsed:>9.1f} {p50:>9.2f} {p99:>9.2f}")
+
+    main.request_log.stop()
+    api.uninstall()
+
+
+if __name__ == '__main__':
+    main_()
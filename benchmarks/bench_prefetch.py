@@ -0,0 +1,83 @@
+"""Задержка кнопки "Дальше": карточка готовится при нажатии против заранее подготовленной
+
+Повторяются сессии пользователей (ответ -> "Дальше" -> ответ ...) через
+настоящие хендлеры main.py. Фоновые задачи, которые хендлеры ставят в
+очередь чата, выполняются между сообщениями - как будто пользователь
+думает над ответом - и в замер не входят.
+
+    python -m benchmarks.bench_prefetch --users 50 --rounds 20
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentile, use_temp_database
+
+use_temp_database('bench_prefetch')
+os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+
+from benchmarks.fake_api import StubTelegramApi, make_update  # noqa: E402
+import main  # noqa: E402
+import migrations  # noqa: E402
+
+
+class DeferredJobs:
+    """Подменяет диспетчер: копит фоновые задачи, чтобы выполнить их вне замера"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def try_submit(self, key, func, *args):
+        self.jobs.append((func, args))
+        return True
+
+    def run_pending(self):
+        jobs, self.jobs = self.jobs, []
+        for func, args in jobs:
+            func(*args)
+
+
+def replay(users, rounds, base_user_id, prefetch):
+    main.PREFETCH_NEXT_CARD = prefetch
+    jobs = DeferredJobs()
+    main.dispatcher = jobs
+
+    for user_id in range(base_user_id, base_user_id + users):
+        main.bot.process_new_updates([make_update(user_id, '/start')])
+    jobs.run_pending()
+
+    latencies = []
+    for _ in range(rounds):
+        for user_id in range(base_user_id, base_user_id + users):
+            main.bot.process_new_updates([make_update(user_id, 'red')])
+            jobs.run_pending()
+
+            started = time.perf_counter()
+            main.bot.process_new_updates([make_update(user_id, main.Command.NEXT)])
+            latencies.append((time.perf_counter() - started) * 1000)
+            jobs.run_pending()
+    return latencies
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    migrations.upgrade(main.db)
+    api = StubTelegramApi().install()
+    print(f"{'mode':<12} {'presses':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    try:
+        for offset, (name, prefetch) in enumerate((('on_demand', False), ('prefetched', True))):
+            latencies = replay(args.users, args.rounds, 3_000_000 + offset * 100_000, prefetch)
+            print(f"{name:<12} {len(latencies):>8} {sum(latencies) / len(latencies):>9.3f} "
+                  f"{percentile(latencies, 0.5):>9.3f} {percentile(latencies, 0.95):>9.3f} "
+                  f"{percentile(latencies, 0.99):>9.3f}")
+    finally:
+        main.request_log.stop()
+        api.uninstall()
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,156 @@
+"""Статистика прогресса для /stats: разбор журнала user_requests против счетчиков progress.py
+
+Для одного пользователя с N ответами в журнале сравниваются три пути:
+
+- log: точность по COUNT(*) ... GROUP BY query и выученные слова проходом по
+  всем строкам correct_answer/wrong_answer пользователя;
+- cold: прогресс читается из word_progress одним запросом (первый /stats после запуска);
+- warm: итоги из памяти, без запросов.
+
+Отдельно - цена ProgressStore.record на ответ и память на одно слово.
+
+    python -m benchmarks.bench_progress
+    python -m benchmarks.bench_progress --answers 1000,10000,100000 --words 300
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database
+
+use_temp_database('bench_progress')
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from database import DatabaseManager, UserRequest, WordProgress  # noqa: E402
+import migrations  # noqa: E402
+from progress import ProgressStore, UserProgress  # noqa: E402
+
+ACTIONS = ('correct_answer', 'wrong_answer')
+
+
+def build_answers(answers, words, seed=1):
+    """[(word_id, правильно ли)]: у трудных слов (каждое пятое) половина ответов с ошибкой"""
+    rng = random.Random(seed)
+    return [
+        (word_id, rng.random() > (0.5 if word_id % 5 == 0 else 0.1))
+        for word_id in (rng.randrange(1, words + 1) for _ in range(answers))
+    ]
+
+
+def fill(db, user_id, answers):
+    """Журнал ответов пользователя и его прогресс в word_progress"""
+    with db.get_session() as session:
+        session.execute(delete(UserRequest).where(UserRequest.user_id == user_id))
+        session.execute(delete(WordProgress).where(WordProgress.user_id == user_id))
+        started = datetime.now() - timedelta(seconds=len(answers))
+        session.execute(insert(UserRequest), [
+            {
+                'user_id': user_id,
+                'provider': 'vocabulary_bot',
+                'query': ACTIONS[0] if correct else ACTIONS[1],
+                'error_message': f"word: word{word_id}",
+                'response_time': 5,
+                'created_at': started + timedelta(seconds=index)
+            }
+            for index, (word_id, correct) in enumerate(answers)
+        ])
+        session.commit()
+
+    progress = UserProgress()
+    now = time.time()
+    for word_id, correct in answers:
+        progress.record(word_id, correct, now)
+    db.save_word_progress([(user_id,) + progress.row(slot) for slot in range(len(progress))])
+    return progress.summary()
+
+
+def stats_from_log(db, user_id, mastered_streak=3):
+    """Как пришлось бы считать без progress.py: агрегат по журналу и проход по всем ответам"""
+    with db.get_session() as session:
+        counts = dict(session.execute(
+            select(UserRequest.query, func.count())
+            .where(UserRequest.user_id == user_id, UserRequest.query.in_(ACTIONS))
+            .group_by(UserRequest.query)
+        ).all())
+        streaks = {}
+        for action, details in session.execute(
+            select(UserRequest.query, UserRequest.error_message)
+            .where(UserRequest.user_id == user_id, UserRequest.query.in_(ACTIONS))
+            .order_by(UserRequest.created_at)
+        ):
+            word = details.split(',')[0]
+            streaks[word] = streaks.get(word, 0) + 1 if action == ACTIONS[0] else 0
+    answers = sum(counts.values())
+    return {
+        'answers': answers,
+        'accuracy': counts.get(ACTIONS[0], 0) / answers if answers else 0.0,
+        'mastered': sum(streak >= mastered_streak for streak in streaks.values()),
+    }
+
+
+def timed(function, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = function()
+    return (time.perf_counter() - started) / iterations * 1000, result
+
+
+def bench_record(words, answers):
+    """Микросекунды на ProgressStore.record и байты памяти на слово в UserProgress"""
+    store = ProgressStore(loader=lambda user_id: [], saver=lambda rows: None)
+    items = build_answers(answers, words, seed=2)
+    store.record(1, *items[0])
+    started = time.perf_counter()
+    for word_id, correct in items:
+        store.record(1, word_id, correct)
+    per_answer_us = (time.perf_counter() - started) / len(items) * 1e6
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    progress = UserProgress()
+    for word_id in range(1, words + 1):
+        progress.record(word_id, True, 0.0)
+    progress.dirty = set()
+    per_word = (tracemalloc.get_traced_memory()[0] - base) / words
+    tracemalloc.stop()
+    return per_answer_us, per_word
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', default='1000,10000,100000', help='ответов в журнале пользователя')
+    parser.add_argument('--words', type=int, default=300, help='слов у пользователя')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    db = DatabaseManager(os.environ['DATABASE_URL'])
+    migrations.upgrade(db)
+    user_id = db.get_or_create_user(9_000_001, 'bench_progress')
+
+    print(f"{'answers':>9} {'log ms':>9} {'cold ms':>9} {'warm ms':>9} {'accuracy':>9} {'mastered':>9}")
+    for size in (int(value) for value in args.answers.split(',')):
+        expected = fill(db, user_id, build_answers(size, args.words))
+        log_ms, from_log = timed(lambda: stats_from_log(db, user_id), max(1, args.iterations // 10))
+
+        def cold():
+            db.progress.invalidate(user_id)
+            return db.progress.summary(user_id)
+
+        cold_ms, summary = timed(cold, args.iterations)
+        warm_ms, summary = timed(lambda: db.progress.summary(user_id), args.iterations * 100)
+        # Оба пути дают одни и те же цифры
+        assert summary['answers'] == from_log['answers'] == expected['answers']
+        assert summary['mastered'] == from_log['mastered'] == expected['mastered']
+        print(f"{size:>9} {log_ms:>9.2f} {cold_ms:>9.2f} {warm_ms:>9.4f} "
+              f"{summary['accuracy']:>9.1%} {summary['mastered']:>9}")
+
+    per_answer_us, per_word = bench_record(args.words, 100_000)
+    print(f"\nrecord: {per_answer_us:.2f} us/answer; memory: {per_word:.0f} B/word in UserProgress")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Сборка сообщений викторины: объекты ReplyKeyboardMarkup против готовых JSON-фрагментов render.py
+
+Воспроизводится поток ответов, как у пользователей: карточка, иногда
+неправильный ответ (та же клавиатура с пометкой ❌), затем правильный ответ.
+Для каждой стратегии - время на карточку и пик временной памяти на одну
+сборку (tracemalloc).
+
+    python -m benchmarks.bench_render --cards 20000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from telebot import types
+
+import render
+from render import Command
+
+WORDS = ['red', 'green', 'blue', 'white', 'black', 'house', 'car', 'sun', 'cat', 'dog',
+         'window', 'river', 'mountain', 'teacher', 'breakfast', 'yesterday', 'beautiful', 'library']
+TRANSLATIONS = {word: f'перевод {word}' for word in WORDS}
+
+
+def build_replay(cards, seed=1):
+    """[(вид, варианты, правильный, ответ)]: карточка, 0-2 ошибки, правильный ответ"""
+    rng = random.Random(seed)
+    events = []
+    for _ in range(cards):
+        options = rng.sample(WORDS, 4)
+        target = options[0]
+        rng.shuffle(options)
+        events.append(('card', options, target, None))
+        for wrong in rng.sample([option for option in options if option != target], rng.choice((0, 0, 1, 2))):
+            events.append(('wrong', options, target, wrong))
+        events.append(('correct', options, target, target))
+    return events
+
+
+def render_objects(kind, options, target, answer):
+    """Как хендлеры собирали сообщения раньше: кнопка за кнопкой через объекты telebot"""
+    if kind == 'card':
+        markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+        for option in options:
+            markup.add(types.KeyboardButton(option))
+        markup.add(
+            types.KeyboardButton(Command.NEXT),
+            types.KeyboardButton(Command.ADD_WORD),
+            types.KeyboardButton(Command.DELETE_WORD)
+        )
+        return f"Выбери перевод слова:\n🇷🇺 {TRANSLATIONS[target]}", markup.to_json()
+    if kind == 'correct':
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+        markup.add(
+            types.KeyboardButton(Command.NEXT),
+            types.KeyboardButton(Command.ADD_WORD),
+            types.KeyboardButton(Command.DELETE_WORD)
+        )
+        return f"✅ Отлично! Правильно!\n{target} -> {TRANSLATIONS[target]}", markup.to_json()
+
+    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+    new_buttons = []
+    for option in options:
+        if option == answer:
+            new_buttons.append(types.KeyboardButton(option + ' ❌'))
+        else:
+            new_buttons.append(types.KeyboardButton(option))
+    for button in new_buttons:
+        markup.add(button)
+    markup.add(
+        types.KeyboardButton(Command.NEXT),
+        types.KeyboardButton(Command.ADD_WORD),
+        types.KeyboardButton(Command.DELETE_WORD)
+    )
+    return f"❌ Неправильно! Попробуйте ещё раз вспомнить слово:\n🇷🇺 {TRANSLATIONS[target]}", markup.to_json()
+
+
+def render_cached(kind, options, target, answer):
+    if kind == 'card':
+        return render.question_text(TRANSLATIONS[target]), render.card_keyboard(options)
+    if kind == 'correct':
+        return render.correct_text(target, TRANSLATIONS[target]), render.SERVICE_KEYBOARD
+    return render.wrong_text(TRANSLATIONS[target]), render.card_keyboard(options, wrong=answer)
+
+
+def measure_time(strategy, events):
+    started = time.perf_counter()
+    for event in events:
+        strategy(*event)
+    return time.perf_counter() - started
+
+
+def measure_peak(strategy, events, sample=2000):
+    """Средний и максимальный пик временной памяти на одну сборку, байт"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for event in events[:sample]:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            result = strategy(*event)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            del result
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks), max(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, default=20000)
+    args = parser.parse_args()
+
+    events = build_replay(args.cards)
+    # Результаты совпадают байт в байт
+    for event in events[:1000]:
+        assert render_objects(*event) == render_cached(*event), event
+
+    print(f"{len(events)} messages for {args.cards} cards")
+    print(f"{'strategy':<10} {'us/message':>11} {'us/card':>9} {'peak B avg':>11} {'peak B max':>11}")
+    for name, strategy in (('objects', render_objects), ('render', render_cached)):
+        measure_time(strategy, events[:1000])  # прогрев
+        elapsed = measure_time(strategy, events)
+        peak_avg, peak_max = measure_peak(strategy, events)
+        print(f"{name:<10} {elapsed / len(events) * 1e6:>11.2f} {elapsed / args.cards * 1e6:>9.2f} "
+              f"{peak_avg:>11.0f} {peak_max:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Задержка выбора следующей карточки в зависимости от размера словаря (10 ... 100k слов)
+
+Меряются два пути: очередь due в памяти (WordPool) и индексный запрос
+по (user_id, due_at) в БД.
+
+    python -m benchmarks.bench_scheduler
+    python -m benchmarks.bench_scheduler --sizes 10,1000,100000 --iterations 2000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import percentile, use_temp_database
+
+use_temp_database('bench_scheduler')
+
+from sqlalchemy import delete, insert, select, update  # noqa: E402
+
+from database import DatabaseManager, User, UserWord, Word  # noqa: E402
+import migrations  # noqa: E402
+from vocabulary import WordPool  # noqa: E402
+
+
+def bench_memory(size, iterations):
+    pool = WordPool()
+    now = time.time()
+    for word_id in range(1, size + 1):
+        pool.add(word_id, f'word{word_id}', f'слово{word_id}', due_ts=now + random.uniform(-86400, 86400))
+
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        word = pool.next_due_word()
+        pool.record_answer(word['word_id'], i % 4 != 0)
+        latencies.append((time.perf_counter() - started) * 1_000_000)
+    return latencies
+
+
+def bench_db(db, user_id, size, iterations):
+    with db.get_session() as session:
+        session.execute(delete(UserWord).where(UserWord.user_id == user_id))
+        word_ids = session.execute(select(Word.id).order_by(Word.id).limit(size)).scalars().all()
+        now = datetime.now()
+        session.execute(insert(UserWord), [
+            {
+                'user_id': user_id,
+                'word_id': word_id,
+                'is_active': True,
+                'due_at': now + timedelta(seconds=random.uniform(-86400, 86400))
+            }
+            for word_id in word_ids
+        ])
+        session.commit()
+
+    next_card = (
+        select(UserWord.word_id, UserWord.due_at)
+        .where(UserWord.user_id == user_id, UserWord.is_active.is_(True))
+        .order_by(UserWord.due_at)
+        .limit(1)
+    )
+    latencies = []
+    with db.get_session() as session:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            word_id, due_at = session.execute(next_card).first()
+            session.execute(
+                update(UserWord)
+                .where(UserWord.user_id == user_id, UserWord.word_id == word_id)
+                .values(due_at=due_at + timedelta(days=1))
+            )
+            latencies.append((time.perf_counter() - started) * 1_000_000)
+        session.rollback()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=os.environ['DATABASE_URL'])
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000')
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    db = DatabaseManager(args.url)
+    migrations.upgrade(db)
+    user_id = db.get_or_create_user(telegram_id=-1, username='bench_scheduler')
+
+    # Слова для БД-варианта создаются один раз под максимальный размер
+    with db.get_session() as session:
+        existing = session.execute(select(Word.id).order_by(Word.id.desc()).limit(1)).scalar() or 0
+        missing = max(sizes) - session.query(Word).count()
+        if missing > 0:
+            session.execute(insert(Word), [
+                {'english_word': f'bench{existing + i}', 'russian_translation': f'бенч{existing + i}', 'is_common': False}
+                for i in range(missing)
+            ])
+            session.commit()
+
+    print(f"{'words':>8} {'mem p50 us':>11} {'mem p99 us':>11} {'db p50 us':>10} {'db p99 us':>10}")
+    for size in sizes:
+        memory = bench_memory(size, args.iterations)
+        database = bench_db(db, user_id, size, args.iterations)
+        print(f"{size:>8} {percentile(memory, 0.5):>11.1f} {percentile(memory, 0.99):>11.1f} "
+              f"{percentile(database, 0.5):>10.1f} {percentile(database, 0.99):>10.1f}")
+
+    with db.get_session() as session:
+        session.execute(delete(UserWord).where(UserWord.user_id == user_id))
+        session.execute(delete(User).where(User.id == user_id))
+        session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Всплеск исходящих сообщений: прямой bot.send_message против SendQueue
+
+Сообщения уходят в заглушку fake_api, которая, как Telegram, отвечает 429
+при превышении лимитов на чат и на бота.
+
+    python -m benchmarks.bench_sender --chats 40 --messages 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from benchmarks.fake_api import StubTelegramApi
+from sender import SendQueue
+
+
+def burst(chats, messages):
+    """Как два send_message на обновление: по messages сообщений каждому чату, чаты вперемешку"""
+    return [(chat_id, f"message {index} to {chat_id}")
+            for index in range(messages) for chat_id in range(1000, 1000 + chats)]
+
+
+def run_direct(bot, items, threads):
+    errors = 0
+
+    def send(item):
+        nonlocal errors
+        try:
+            bot.send_message(*item)
+        except ApiTelegramException:
+            errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, items))
+    return time.perf_counter() - started, {'failed': errors}
+
+
+def run_queue(bot, items, merge, workers):
+    queue = SendQueue(bot, workers=workers, merge=merge)
+    queue.start()
+    started = time.perf_counter()
+    for chat_id, text in items:
+        queue.send_message(chat_id, text)
+    queue.stop(timeout=300)
+    return time.perf_counter() - started, queue.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=40)
+    parser.add_argument('--messages', type=int, default=4, help='сообщений каждому чату')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--api-latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    bot = TeleBot('123456:BENCH', threaded=False)
+    items = burst(args.chats, args.messages)
+
+    print(f"{'mode':<12} {'seconds':>8} {'delivered':>10} {'api 429':>8} {'failed':>7} {'merged':>7} {'p95 ms':>8}")
+    for name, run in (
+        ('direct', lambda: run_direct(bot, items, args.workers)),
+        ('queue', lambda: run_queue(bot, items, False, args.workers)),
+        ('queue+merge', lambda: run_queue(bot, items, True, args.workers)),
+    ):
+        api = StubTelegramApi(latency=args.api_latency_ms / 1000, chat_rate=1, global_rate=30).install()
+        try:
+            elapsed, stats = run()
+        finally:
+            api.uninstall()
+        delivered = sum(len(texts) for texts in api.messages.values())
+        print(f"{name:<12} {elapsed:>8.2f} {delivered:>10} {api.limited:>8} {stats['failed']:>7} "
+              f"{stats.get('merged', 0):>7} {stats.get('p95_ms', 0):>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Задержка операций с состоянием (retrieve_data/set_state) для разных хранилищ
+
+Redis-бэкенд проверяется на локальном фейковом клиенте, без сервера.
+
+    python -m benchmarks.bench_state --iterations 5000
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import percentile, use_temp_database
+
+use_temp_database('bench_state')
+
+from telebot.storage import StateMemoryStorage  # noqa: E402
+
+from database import DatabaseManager  # noqa: E402
+import migrations  # noqa: E402
+from state_storage import RedisStateBackend, SQLStateBackend, TieredStateStorage  # noqa: E402
+
+
+class FakeRedis:
+    """Минимальный клиент с интерфейсом redis-py: get/set(ex=)/delete"""
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        value, expires_at = self._data.get(key, (None, None))
+        if expires_at is not None and expires_at < time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self._data[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+
+def bench(storage, iterations, chats=100):
+    reads, writes = [], []
+    for i in range(iterations):
+        chat_id = i % chats
+
+        started = time.perf_counter()
+        storage.set_state(chat_id, chat_id, 'MyStates:target_word')
+        writes.append((time.perf_counter() - started) * 1_000_000)
+
+        started = time.perf_counter()
+        with storage.get_interactive_data(chat_id, chat_id) as data:
+            data.get('target_word')
+        reads.append((time.perf_counter() - started) * 1_000_000)
+
+        if i % 10 == 0:
+            with storage.get_interactive_data(chat_id, chat_id) as data:
+                data['target_word'] = f'word{i}'
+                data['options'] = ['a', 'b', 'c', 'd']
+    return reads, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=os.environ['DATABASE_URL'])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.url)
+    migrations.upgrade(db)
+    storages = {
+        'memory': StateMemoryStorage(),
+        'sql': TieredStateStorage(SQLStateBackend(db)),
+        'redis-fake': TieredStateStorage(RedisStateBackend(FakeRedis(), idle_timeout=3600)),
+    }
+
+    print(f"{'storage':<12} {'read p50 us':>12} {'read p99 us':>12} {'set_state p50 us':>17} {'set_state p99 us':>17}")
+    for name, storage in storages.items():
+        reads, writes = bench(storage, args.iterations)
+        print(f"{name:<12} {percentile(reads, 0.5):>12.1f} {percentile(reads, 0.99):>12.1f} "
+              f"{percentile(writes, 0.5):>17.1f} {percentile(writes, 0.99):>17.1f}")
+
+    # Данные переживают "перезапуск": новое хранилище поверх той же таблицы
+    restarted = TieredStateStorage(SQLStateBackend(db))
+    print(f"after restart: state={restarted.get_state(1, 1)!r} data={restarted.get_data(1, 1)!r}")
+
+
+if __name__ == '__main__':
+    main()
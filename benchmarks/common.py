@@ -0,0 +1,23 @@
+"""Общее для бенчмарков: временная SQLite и перцентили"""
+import os
+import tempfile
+
+
+def temp_database_url(name):
+    """URL новой SQLite во временном каталоге"""
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'{name}.db')
+
+
+def use_temp_database(name):
+    """Направляет DATABASE_URL во временную SQLite, если он не задан
+
+    Вызывается до импорта config/database/main: config.py читает DATABASE_URL при импорте.
+    """
+    os.environ.setdefault('DATABASE_URL', temp_database_url(name))
+    return os.environ['DATABASE_URL']
+
+
+def percentile(values, pct):
+    """Перцентиль pct (0..1) по ближайшему рангу; для пустого списка - 0"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
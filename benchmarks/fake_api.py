@@ -0,0 +1,126 @@
+"""Заглушка Telegram Bot API и генератор синтетических обновлений для бенчмарков"""
+import itertools
+import json
+import threading
+import time
+
+from telebot import apihelper, types
+
+from sender import TokenBucket
+
+SEND_METHODS = ('sendMessage', 'sendDocument')
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+
+class StubTelegramApi:
+    """Отвечает на запросы бота без сети, с опциональной задержкой на каждый вызов
+
+    С chat_rate / global_rate ведет себя как Telegram под нагрузкой: отвечает
+    429 с parameters.retry_after, если чату отправляют чаще chat_rate
+    сообщений в секунду (с запасом chat_burst) или боту в целом - чаще global_rate.
+    """
+
+    def __init__(self, latency=0.0, chat_rate=None, chat_burst=3, global_rate=None):
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate) if global_rate else None
+        self.chat_buckets = {}
+        self.calls = {}
+        self.messages = {}  # chat_id -> [text] принятых сообщений
+        self.limited = 0
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def install(self):
+        apihelper.CUSTOM_REQUEST_SENDER = self
+        return self
+
+    def uninstall(self):
+        if apihelper.CUSTOM_REQUEST_SENDER is self:
+            apihelper.CUSTOM_REQUEST_SENDER = None
+
+    def _throttle(self, chat_id):
+        """Секунды до разрешения отправки в чат (0 - можно отправлять сейчас)"""
+        now = time.monotonic()
+        wait = 0
+        if self.chat_rate:
+            bucket = self.chat_buckets.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+            wait = bucket.take(now)
+        if not wait and self.global_bucket:
+            wait = self.global_bucket.take(now)
+        return wait
+
+    def __call__(self, method, url, params=None, files=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        with self._lock:
+            self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        params = params or {}
+        if api_method in SEND_METHODS:
+            chat_id = int(params.get('chat_id', 0))
+            with self._lock:
+                wait = self._throttle(chat_id)
+                if wait:
+                    self.limited += 1
+                    retry_after = max(1, int(wait + 0.999))
+                    return FakeResponse({
+                        'ok': False,
+                        'error_code': 429,
+                        'description': f'Too Many Requests: retry after {retry_after}',
+                        'parameters': {'retry_after': retry_after},
+                    }, status_code=429)
+                self.messages.setdefault(chat_id, []).append(params.get('text', ''))
+            result = {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        elif api_method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        else:
+            result = True
+        return FakeResponse({'ok': True, 'result': result})
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(user_id, text, username=None):
+    """Строит Update с текстовым сообщением от пользователя user_id в личном чате"""
+    return types.Update.de_json(make_update_payload(user_id, text, username))
+
+
+def make_update_payload(user_id, text, username=None):
+    """JSON обновления (как его присылает Telegram) с текстовым сообщением"""
+    update_id = next(_update_ids)
+    payload = {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {
+                'id': user_id,
+                'is_bot': False,
+                'first_name': f'User{user_id}',
+                'username': username or f'user{user_id}',
+            },
+            'text': text,
+        },
+    }
+    if text.startswith('/'):
+        payload['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return payload
@@ -0,0 +1,98 @@
+"""Генератор синтетических сессий пользователей для нагрузочных прогонов
+
+Сессия - последовательность шагов (вид, текст), как их шлет живой
+пользователь: /start, поток ответов с долей ошибок и "Дальше", пачки
+добавления и удаления слов, /stats. Тексты ответов зависят от карточки,
+которую бот покажет во время прогона, поэтому для шагов answer_right и
+answer_wrong текст подставляет раннер (resolve_answer) по состоянию бота.
+"""
+import random
+from collections import namedtuple
+
+from render import Command
+
+Step = namedtuple('Step', ['user_id', 'kind', 'text'])
+
+START = 'start'
+ANSWER_RIGHT = 'answer_right'
+ANSWER_WRONG = 'answer_wrong'
+NEXT = 'next'
+ADD = 'add'
+DELETE = 'delete'
+STATS = 'stats'
+
+KINDS = (START, ANSWER_RIGHT, ANSWER_WRONG, NEXT, ADD, DELETE, STATS)
+
+
+class SessionMix:
+    """Параметры поведения пользователя"""
+
+    def __init__(self, answers=30, wrong_rate=0.3, next_rate=0.1, add_bursts=1, add_burst_size=3,
+                 delete_rate=0.5, stats_every=15):
+        self.answers = answers                # ответов на карточки за сессию
+        self.wrong_rate = wrong_rate          # доля неправильных ответов
+        self.next_rate = next_rate            # доля пропусков карточки кнопкой "Дальше"
+        self.add_bursts = add_bursts          # пачек добавления слов за сессию
+        self.add_burst_size = add_burst_size  # слов в пачке
+        self.delete_rate = delete_rate        # доля добавленных слов, которые потом удаляются
+        self.stats_every = stats_every        # /stats каждые N ответов (0 - никогда)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def user_session(user_id, mix, rng):
+    """Шаги одного пользователя по порядку"""
+    steps = [Step(user_id, START, '/start')]
+    added = []
+    burst_at = set(rng.sample(range(1, mix.answers), min(mix.add_bursts, max(mix.answers - 1, 0))))
+
+    for index in range(mix.answers):
+        if index in burst_at:
+            for _ in range(mix.add_burst_size):
+                english = f"word{user_id}x{len(added)}"
+                # Кнопка, слово, перевод - три обновления на одно добавление
+                steps.append(Step(user_id, ADD, Command.ADD_WORD))
+                steps.append(Step(user_id, ADD, english))
+                steps.append(Step(user_id, ADD, f"слово {len(added)}"))
+                added.append(english)
+
+        roll = rng.random()
+        if roll < mix.next_rate:
+            steps.append(Step(user_id, NEXT, Command.NEXT))
+        elif roll < mix.next_rate + mix.wrong_rate:
+            steps.append(Step(user_id, ANSWER_WRONG, None))
+        else:
+            steps.append(Step(user_id, ANSWER_RIGHT, None))
+            # После правильного ответа карточку сменяет "Дальше"
+            steps.append(Step(user_id, NEXT, Command.NEXT))
+
+        if mix.stats_every and index % mix.stats_every == mix.stats_every - 1:
+            steps.append(Step(user_id, STATS, '/stats'))
+
+    for english in rng.sample(added, int(len(added) * mix.delete_rate)):
+        steps.append(Step(user_id, DELETE, Command.DELETE_WORD))
+        steps.append(Step(user_id, DELETE, english))
+    return steps
+
+
+def generate(users, mix, base_user_id=6_000_000, seed=1):
+    """Шаги всех пользователей вперемешку: по шагу каждого по кругу, как приходят обновления"""
+    rng = random.Random(seed)
+    sessions = [user_session(user_id, mix, rng) for user_id in range(base_user_id, base_user_id + users)]
+    steps = []
+    for position in range(max(len(session) for session in sessions)):
+        for session in sessions:
+            if position < len(session):
+                steps.append(session[position])
+    return steps
+
+
+def resolve_answer(step, card, rng):
+    """Текст ответа на текущую карточку ({'target_word', 'options'}); None, если карточки нет"""
+    if not card or 'target_word' not in card:
+        return None
+    if step.kind == ANSWER_RIGHT:
+        return card['target_word']
+    wrong = [option for option in card.get('options', ()) if option != card['target_word']]
+    return rng.choice(wrong) if wrong else card['target_word']
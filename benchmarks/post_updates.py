@@ -0,0 +1,128 @@
+"""Отправка записанных обновлений на вебхук бота через HTTP POST
+
+Обновления берутся из файла (JSON-массив или по объекту в строке, как их
+присылает Telegram) или генерируются. Без --url поднимается бот из main.py
+с заглушкой Telegram API и вебхуком на localhost - проверка от HTTP до
+хендлеров целиком.
+
+    python -m benchmarks.post_updates --users 50 --messages 20
+    python -m benchmarks.post_updates --file updates.ndjson --url http://localhost:8443/webhook --secret s3cret
+"""
+import argparse
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import use_temp_database
+
+use_temp_database('bench_webhook')
+os.environ.setdefault('BOT_TOKEN', '123456:BENCH')
+
+from benchmarks.fake_api import make_update_payload  # noqa: E402
+from webhook import SECRET_HEADER  # noqa: E402
+
+
+def load_updates(path):
+    with open(path, encoding='utf-8') as stream:
+        text = stream.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def generate_updates(users, messages):
+    answers = ['red', 'green', 'blue', 'cat', 'Дальше ⏭']
+    updates = []
+    for step in range(messages):
+        for user_id in range(4_000_000, 4_000_000 + users):
+            updates.append(make_update_payload(user_id, '/start' if step == 0 else random.choice(answers)))
+    return updates
+
+
+def post(url, payload, secret):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), method='POST')
+    request.add_header('Content-Type', 'application/json')
+    if secret:
+        request.add_header(SECRET_HEADER, secret)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def send_all(url, updates, secret, concurrency):
+    """Отправляет обновления; сообщения одного чата - по порядку, разные чаты - параллельно"""
+    by_chat = {}
+    for payload in updates:
+        chat_id = payload.get('message', {}).get('chat', {}).get('id', payload['update_id'])
+        by_chat.setdefault(chat_id, []).append(payload)
+
+    statuses = {}
+    latencies = []
+
+    def send_chat(payloads):
+        for payload in payloads:
+            started = time.perf_counter()
+            status = post(url, payload, secret)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send_chat, by_chat.values()))
+    return time.perf_counter() - started, statuses, sorted(latencies)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='адрес запущенного вебхука; без него бот поднимается локально')
+    parser.add_argument('--file', help='файл с записанными обновлениями')
+    parser.add_argument('--secret', default='bench-secret')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--api-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) if args.file else generate_updates(args.users, args.messages)
+
+    server = api = None
+    url = args.url
+    if url is None:
+        from benchmarks.fake_api import StubTelegramApi
+        api = StubTelegramApi(latency=args.api_latency_ms / 1000).install()
+        import main
+        import migrations
+        from webhook import WebhookServer
+
+        migrations.upgrade(main.db)
+
+        if main.dispatcher:
+            main.dispatcher.start()
+        server = WebhookServer(main.bot, port=0, secret_token=args.secret)
+        url = f"http://127.0.0.1:{server.start()}{server.path}"
+
+    elapsed, statuses, latencies = send_all(url, updates, args.secret, args.concurrency)
+    print(f"Posted {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.0f} upd/s), statuses: {statuses}")
+    print(f"HTTP ack p50={latencies[len(latencies) // 2]:.2f} ms, "
+          f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.2f} ms")
+
+    if server is not None:
+        started = time.perf_counter()
+        server.stop()
+        if main.dispatcher:
+            main.dispatcher.stop()
+        main.request_log.stop()
+        print(f"Drained in {time.perf_counter() - started:.2f}s: webhook {server.stats()}")
+        if main.dispatcher:
+            print(f"dispatcher: {main.dispatcher.stats()}")
+        api.uninstall()
+
+
+if __name__ == '__main__':
+    main_()
@@ -18,4 +18,92 @@ DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
 # Дополнительные настройки
 MAX_WORDS_PER_USER = 1000
-SESSION_TIMEOUT = 3600  # 1 час в секундах
\ No newline at end of file
+SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', '3600'))  # 1 час в секундах, после простоя состояние викторины сбрасывается
+
+# Фоновая запись логов действий (write-behind очередь)
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '200'))
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '1.0'))  # секунды
+LOG_OVERFLOW_POLICY = os.getenv('LOG_OVERFLOW_POLICY', 'drop_oldest')  # drop_oldest / drop_new / block
+
+# Кэш пользователей (telegram_id -> users.id)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '600'))  # секунды
+
+# Кэш словарей пользователей (users.id -> активные слова)
+VOCAB_CACHE_SIZE = int(os.getenv('VOCAB_CACHE_SIZE', '5000'))
+VOCAB_CACHE_TTL = int(os.getenv('VOCAB_CACHE_TTL', '1800'))  # секунды
+
+# Прогресс по словам (progress.py): точность, серии и сложность слов
+PROGRESS_CACHE_SIZE = int(os.getenv('PROGRESS_CACHE_SIZE', '10000'))  # пользователей в памяти
+PROGRESS_CHECKPOINT_INTERVAL = int(os.getenv('PROGRESS_CHECKPOINT_INTERVAL', '30'))  # секунды между записями в БД
+PROGRESS_BATCH_SIZE = int(os.getenv('PROGRESS_BATCH_SIZE', '500'))  # строк в одном upsert
+MASTERED_STREAK = int(os.getenv('MASTERED_STREAK', '3'))  # правильных ответов подряд, чтобы слово считалось выученным
+DIFFICULTY_WEIGHT = float(os.getenv('DIFFICULTY_WEIGHT', '1.0'))  # насколько ошибки приближают повтор; 0 - только SM-2
+
+# Параллельная обработка обновлений (0 - последовательно в потоке polling)
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', '8'))
+DISPATCH_QUEUE_SIZE = int(os.getenv('DISPATCH_QUEUE_SIZE', '1000'))  # на один воркер
+
+# Учет SQL-запросов по хендлерам (query_guard.py): off, warn или strict (исключение при превышении бюджета)
+QUERY_GUARD = os.getenv('QUERY_GUARD', 'off')
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', '10'))  # запросов на обновление, если хендлеру не задан свой
+QUERY_GUARD_DEBUG = os.getenv('QUERY_GUARD_DEBUG', 'False').lower() == 'true'  # список запросов при нарушении
+
+# Пул соединений с БД
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # секунды ожидания свободного соединения
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # секунды жизни соединения, -1 - без ограничения
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true'
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))  # 0 - без ограничения (только PostgreSQL)
+DB_EXPIRE_ON_COMMIT = os.getenv('DB_EXPIRE_ON_COMMIT', 'False').lower() == 'true'
+# Схема БД обновляется командой manage.py migrate; true - бот применяет миграции сам при запуске
+AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'False').lower() == 'true'
+
+# Хранилище состояний бота: memory (как раньше, теряется при перезапуске), sql или redis
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sql')
+STATE_HOT_TTL = int(os.getenv('STATE_HOT_TTL', '60'))  # секунды доверия к кэшу в памяти (только один процесс)
+# true - несколько процессов бота (вебхук за балансировщиком) делят одно хранилище: кэш в памяти выключается
+STATE_SHARED = os.getenv('STATE_SHARED', 'False').lower() == 'true'
+STATE_SWEEP_INTERVAL = int(os.getenv('STATE_SWEEP_INTERVAL', '300'))  # секунды между очистками истекших сессий
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Журнал user_requests: помесячные партиции (PostgreSQL) и срок хранения
+LOG_PARTITION_MONTHS_AHEAD = int(os.getenv('LOG_PARTITION_MONTHS_AHEAD', '3'))
+LOG_RETENTION_MONTHS = int(os.getenv('LOG_RETENTION_MONTHS', '12'))  # 0 - хранить всегда
+LOG_RETENTION_MODE = os.getenv('LOG_RETENTION_MODE', 'drop')  # drop / detach (оставить архивной таблицей)
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '86400'))  # секунды
+
+# Выгрузка журнала и словарей администратором (/export)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '5000'))  # строк в одной странице выборки
+EXPORT_MAX_DOCUMENT_MB = int(os.getenv('EXPORT_MAX_DOCUMENT_MB', '50'))  # лимит Bot API на отправку файла
+
+# Загрузка списка слов файлом CSV/TSV
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))  # строк в одном INSERT
+IMPORT_MAX_FILE_MB = int(os.getenv('IMPORT_MAX_FILE_MB', '20'))  # больше Bot API скачать не дает
+
+# Индекс похожих слов для вариантов ответа (строится командой manage.py build-similarity)
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', 'similarity.idx')
+SIMILARITY_NEIGHBORS = int(os.getenv('SIMILARITY_NEIGHBORS', '8'))
+
+# Следующая карточка готовится в фоне, пока пользователь отвечает на текущую. Выключено:
+# по bench_prefetch выигрыша нет, а каждая карточка стоит лишней записи состояния
+PREFETCH_NEXT_CARD = os.getenv('PREFETCH_NEXT_CARD', 'False').lower() == 'true'
+
+# Режим получения обновлений: polling (long polling) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # публичный https-адрес; пусто - вебхук регистрируется вручную
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')  # наружу вебхук открывает reverse proxy с TLS
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # заголовок X-Telegram-Bot-Api-Secret-Token, обязателен для вебхука
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '10000'))
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '100'))
+
+# Очередь исходящих сообщений (лимиты Telegram: ~1 сообщение в секунду в чат, ~30 в секунду всего)
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', '4'))  # 0 - отправлять напрямую из хендлера
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30'))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', '1'))
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', '3'))
+SEND_MERGE_TEXTS = os.getenv('SEND_MERGE_TEXTS', 'True').lower() == 'true'
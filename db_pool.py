@@ -0,0 +1,69 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Время ожидания соединения из пула и его загрузка"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.peak_checked_out = 0
+
+    def record(self, wait_ms, checked_out):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            if wait_ms > self.max_wait_ms:
+                self.max_wait_ms = wait_ms
+            if checked_out > self.peak_checked_out:
+                self.peak_checked_out = checked_out
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': self.total_wait_ms / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': self.max_wait_ms,
+                'peak_checked_out': self.peak_checked_out,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, который замеряет ожидание свободного соединения"""
+
+    metrics = None
+
+    def _do_get(self):
+        if self.metrics is None:
+            self.metrics = PoolMetrics()
+
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record((time.perf_counter() - started) * 1000, self.checkedout())
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def saturation(self):
+        """Доля занятых соединений от максимума (pool_size + max_overflow)"""
+        capacity = self.size() + max(self._max_overflow, 0)
+        return self.checkedout() / capacity if capacity else 0.0
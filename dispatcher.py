@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+from metrics import LatencyHistogram
+
+_STOP = object()
+
+
+def chat_key(update):
+    """Ключ упорядочивания: id чата, из которого пришло обновление"""
+    message = update.message or update.edited_message
+    if message is not None:
+        return message.chat.id
+    if update.callback_query is not None:
+        if update.callback_query.message is not None:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    return update.update_id
+
+
+class ChatOrderedDispatcher:
+    """Параллельная обработка обновлений с сохранением порядка внутри чата
+
+    Каждый воркер читает свою очередь, а чат всегда попадает в одну и ту же
+    очередь (chat_id % workers). Поэтому сообщения одного чата выполняются
+    строго по порядку и переходы MyStates не перемешиваются, а медленный
+    хендлер задерживает только чаты своей очереди.
+
+    Бот должен быть создан с threaded=False, чтобы хендлеры выполнялись
+    прямо в потоке воркера.
+    """
+
+    def __init__(self, bot, workers=8, queue_size=1000):
+        if bot.threaded:
+            raise ValueError("ChatOrderedDispatcher requires TeleBot(threaded=False)")
+
+        self.bot = bot
+        self.workers = workers
+        self._process_updates = bot.process_new_updates
+        self._lanes = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.submitted = 0
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._latency = LatencyHistogram()  # мкс от постановки в очередь до завершения
+
+    def start(self):
+        """Запускает воркеры и подменяет bot.process_new_updates"""
+        if self._threads:
+            return
+        for index, lane in enumerate(self._lanes):
+            thread = threading.Thread(target=self._run, args=(lane,), name=f'UpdateWorker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.bot.process_new_updates = self.dispatch
+
+    def dispatch(self, updates):
+        """Раскладывает обновления по очередям воркеров"""
+        for update in updates:
+            # Сдвигаем offset сразу, иначе следующий getUpdates вернет их повторно
+            if update.update_id > self.bot.last_update_id:
+                self.bot.last_update_id = update.update_id
+            self.submit(chat_key(update), self._process_updates, [update])
+
+    def submit(self, key, func, *args):
+        """Ставит задачу в очередь чата key; блокируется, если очередь заполнена"""
+        lane = self._lanes[hash(key) % self.workers]
+        lane.put((time.monotonic(), func, args))
+
+        depth = lane.qsize()
+        with self._lock:
+            self.submitted += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def try_submit(self, key, func, *args):
+        """Как submit, но без ожидания: при заполненной очереди задача отбрасывается (False)
+
+        Подходит для необязательной фоновой работы, которую ставят сами хендлеры:
+        воркер не должен блокироваться на собственной очереди.
+        """
+        lane = self._lanes[hash(key) % self.workers]
+        try:
+            lane.put_nowait((time.monotonic(), func, args))
+        except queue.Full:
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _run(self, lane):
+        while True:
+            item = lane.get()
+            if item is _STOP:
+                lane.task_done()
+                return
+
+            enqueued_at, func, args = item
+            try:
+                func(*args)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Update processing error: {e}")
+
+            latency = (time.monotonic() - enqueued_at) * 1_000_000
+            with self._lock:
+                self.processed += 1
+                self._latency.record(latency)
+            lane.task_done()
+
+    def join(self):
+        """Ждет, пока воркеры выполнят все поставленные задачи, включая поставленные самими задачами"""
+        for lane in self._lanes:
+            lane.join()
+
+    def stop(self, timeout=10.0):
+        """Дожидается обработки уже принятых обновлений и останавливает воркеры"""
+        self.bot.process_new_updates = self._process_updates
+        for lane in self._lanes:
+            lane.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        """Возвращает глубину очередей, счетчики и перцентили задержки"""
+        depths = [lane.qsize() for lane in self._lanes]
+        with self._lock:
+            result = {
+                'workers': self.workers,
+                'queue_depth': sum(depths),
+                'lane_depths': depths,
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'errors': self.errors,
+            }
+            result.update(self._latency.percentiles_ms())
+        return result
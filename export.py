@@ -0,0 +1,144 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from database import User, UserRequest, UserWord, Word
+
+FORMATS = ('csv', 'ndjson')
+
+
+def _activity_query():
+    return select(
+        UserRequest.id,
+        UserRequest.created_at,
+        User.telegram_id,
+        User.username,
+        UserRequest.provider,
+        UserRequest.query,
+        UserRequest.response_time,
+        UserRequest.success,
+        UserRequest.error_message
+    ).outerjoin(
+        User, UserRequest.user_id == User.id
+    ), UserRequest
+
+
+def _vocabulary_query():
+    return select(
+        UserWord.id,
+        UserWord.created_at,
+        User.telegram_id,
+        Word.english_word,
+        Word.russian_translation,
+        Word.is_common,
+        UserWord.is_active,
+        UserWord.ease,
+        UserWord.interval,
+        UserWord.repetitions,
+        UserWord.due_at
+    ).join(
+        User, UserWord.user_id == User.id
+    ).join(
+        Word, UserWord.word_id == Word.id
+    ), UserWord
+
+
+DATASETS = {
+    'activity': _activity_query,
+    'vocabulary': _vocabulary_query,
+}
+
+
+def iter_chunks(engine, dataset, chunk_size=5000, since=None):
+    """Выдает строки набора dataset списками не длиннее chunk_size
+
+    Страницы выбираются по ключу id: каждая следующая начинается после
+    последней строки предыдущей, без OFFSET, поэтому стоимость страницы не
+    растет к концу таблицы. Ключ - только id: created_at в SQLite хранится
+    строкой с точностью до секунды, и сравнение с datetime из предыдущей
+    страницы пропускало бы строки той же секунды. Внутри страницы строки
+    читаются курсором на стороне сервера (stream_results), и в памяти
+    одновременно держится не больше одной пачки.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown export dataset: {dataset}")
+
+    query, table = DATASETS[dataset]()
+    if since is not None:
+        query = query.where(table.created_at >= since)
+    query = query.order_by(table.id)
+
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(table.id > last_id)
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(page.limit(chunk_size))
+            chunk = [row._asdict() for row in result]
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1]['id']
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def write_csv(chunks, stream):
+    """Пишет пачки строк в CSV по мере их поступления. Возвращает число строк"""
+    writer = None
+    rows = 0
+    for chunk in chunks:
+        if writer is None:
+            writer = csv.DictWriter(stream, fieldnames=list(chunk[0]))
+            writer.writeheader()
+        for row in chunk:
+            writer.writerow({key: _plain(value) for key, value in row.items()})
+        rows += len(chunk)
+    return rows
+
+
+def write_ndjson(chunks, stream):
+    """Пишет пачки строк построчно в JSON (один объект на строку). Возвращает число строк"""
+    rows = 0
+    for chunk in chunks:
+        for row in chunk:
+            stream.write(json.dumps({key: _plain(value) for key, value in row.items()}, ensure_ascii=False))
+            stream.write('\n')
+        rows += len(chunk)
+    return rows
+
+
+WRITERS = {
+    'csv': write_csv,
+    'ndjson': write_ndjson,
+}
+
+
+def export_to_file(engine, dataset, fmt='csv', path=None, chunk_size=5000, since=None):
+    """Выгружает набор dataset в файл fmt (по умолчанию - временный). Возвращает (путь, число строк)"""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix=f'{dataset}_', suffix=f'.{fmt}')
+        os.close(fd)
+
+    try:
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            rows = WRITERS[fmt](iter_chunks(engine, dataset, chunk_size, since), stream)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, rows
@@ -1,12 +1,32 @@
+import os
 import random
-from telebot import types, TeleBot, custom_filters
-from telebot.storage import StateMemoryStorage
+import signal
+import threading
+from telebot import TeleBot, custom_filters
 from telebot.handler_backends import State, StatesGroup
-from datetime import datetime
 
 # Импортируем нашу оптимизированную БД с SQLAlchemy
 from database import db
-from config import BOT_TOKEN
+from config import (BOT_TOKEN, LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_OVERFLOW_POLICY,
+                    DISPATCH_WORKERS, DISPATCH_QUEUE_SIZE, SESSION_TIMEOUT, STATE_BACKEND, STATE_HOT_TTL,
+                    STATE_SWEEP_INTERVAL, STATE_SHARED, REDIS_URL, ADMIN_IDS, MAX_WORDS_PER_USER, PARTITION_MAINTENANCE_INTERVAL,
+                    EXPORT_CHUNK_SIZE, EXPORT_MAX_DOCUMENT_MB, IMPORT_BATCH_SIZE, IMPORT_MAX_FILE_MB,
+                    PREFETCH_NEXT_CARD, BOT_MODE, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+                    WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE, WEBHOOK_BATCH_SIZE, SEND_WORKERS, SEND_GLOBAL_RATE,
+                    SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MERGE_TEXTS, AUTO_MIGRATE,
+                    QUERY_GUARD, QUERY_BUDGET_DEFAULT, QUERY_GUARD_DEBUG, PROGRESS_CHECKPOINT_INTERVAL)
+from dispatcher import ChatOrderedDispatcher
+import export
+import metrics
+import migrations
+from query_guard import QueryGuard
+import render
+from render import Command
+from request_logger import RequestLogWriter
+from sender import SendQueue
+from state_storage import create_state_storage
+from webhook import WebhookServer
+import word_import
 
 print('Starting telegram bot...')
 
@@ -15,16 +35,64 @@ if BOT_TOKEN == 'your_bot_token_here':
     print("ERROR: Please set your bot token in config.py")
     exit(1)
 
-state_storage = StateMemoryStorage()
-bot = TeleBot(BOT_TOKEN, state_storage=state_storage)
+# Состояния викторины переживают перезапуск и доступны всем процессам бота
+state_storage = create_state_storage(
+    db,
+    backend=STATE_BACKEND,
+    idle_timeout=SESSION_TIMEOUT,
+    hot_ttl=STATE_HOT_TTL,
+    redis_url=REDIS_URL,
+    shared=STATE_SHARED
+)
+# Хендлеры выполняются в воркерах диспетчера, поэтому встроенный пул потоков TeleBot отключен
+bot = TeleBot(BOT_TOKEN, state_storage=state_storage, threaded=False)
+
+# Обновления разных чатов обрабатываются параллельно, одного чата - по порядку
+dispatcher = ChatOrderedDispatcher(bot, workers=DISPATCH_WORKERS, queue_size=DISPATCH_QUEUE_SIZE) if DISPATCH_WORKERS else None
+
+print("✓ Database configured, connection is opened on first use")
+
+# Логи действий пишутся в фоне пачками, а не в потоке обработки сообщения
+request_log = RequestLogWriter(
+    db,
+    max_queue_size=LOG_QUEUE_SIZE,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    overflow_policy=LOG_OVERFLOW_POLICY
+)
+request_log.start()
+
+# Ответы уходят через очередь с лимитами Telegram; при SEND_WORKERS=0 - напрямую через bot
+if SEND_WORKERS:
+    sender = SendQueue(
+        bot,
+        workers=SEND_WORKERS,
+        global_rate=SEND_GLOBAL_RATE,
+        chat_rate=SEND_CHAT_RATE,
+        chat_burst=SEND_CHAT_BURST,
+        merge=SEND_MERGE_TEXTS
+    )
+    sender.start()
+else:
+    sender = bot
 
-print("✓ Database initialized successfully with SQLAlchemy")
+# Бюджеты SQL-запросов на обновление, отличные от QUERY_BUDGET_DEFAULT (None - без ограничения)
+QUERY_BUDGETS = {
+    'import_words': None,  # число INSERT растет с размером файла
+}
 
+# Запросы каждого хендлера учитываются и сверяются с бюджетом (раньше замера времени:
+# в режиме strict прерванный запрос не должен оставлять незакрытый замер)
+query_guard = QueryGuard(
+    mode=QUERY_GUARD,
+    default_budget=QUERY_BUDGET_DEFAULT,
+    budgets=QUERY_BUDGETS,
+    debug=QUERY_GUARD_DEBUG
+)
+db.on_engine(query_guard.install)
 
-class Command:
-    ADD_WORD = 'Добавить слово ➕'
-    DELETE_WORD = 'Удалить слово🔙'
-    NEXT = 'Дальше ⏭'
+# Время хендлеров в БД считается по событиям SQLAlchemy (engine создается при первом запросе)
+db.on_engine(metrics.install_db_timing)
 
 
 class MyStates(StatesGroup):
@@ -37,27 +105,34 @@ class MyStates(StatesGroup):
 
 
 def log_user_action(telegram_id, action_type, details=""):
-    """Логирует действия пользователя"""
-    try:
-        db.log_user_request(
-            telegram_id=telegram_id,
-            provider='vocabulary_bot',
-            query=action_type,
-            response_time=0,
-            success=True,
-            error_message=details
-        )
-    except Exception as e:
-        print(f"Logging error: {e}")
-
+    """Логирует действия пользователя (через фоновую очередь)
+
+    Внутри хендлера запись ставится в очередь по его завершении,
+    с реальным временем обработки в response_time.
+    """
+    def enqueue(response_time=0):
+        try:
+            request_log.log(
+                telegram_id=telegram_id,
+                provider='vocabulary_bot',
+                query=action_type,
+                response_time=response_time,
+                success=True,
+                error_message=details
+            )
+        except Exception as e:
+            print(f"Logging error: {e}")
 
-def show_target(data):
-    return f"{data['target_word']} -> {data['translate_word']}"
+    context = metrics.current_context()
+    if context is not None:
+        context.on_finish.append(enqueue)
+    else:
+        enqueue()
 
 
 @bot.message_handler(commands=['start', 'cards'])
+@metrics.timed_handler
 def start_handler(message):
-    start_time = datetime.now()
     cid = message.chat.id
     user_id = message.from_user.id
     username = message.from_user.username or "Unknown"
@@ -72,267 +147,270 @@ def start_handler(message):
         last_name=message.from_user.last_name
     )
 
-    response_time = int((datetime.now() - start_time).total_seconds() * 1000)
     log_user_action(user_id, "start_command", f"username: {username}")
 
     # Приветственное сообщение
-    welcome_text = """Привет 👋 Давай попрактикуемся в английском языке. Тренировки можешь проходить в удобном для себя темпе.
-
-У тебя есть возможность использовать тренажёр, как конструктор, и собирать свою собственную базу для обучения. Для этого воспользуйся инструментами:
-
-• добавить слово ➕
-• удалить слово 🔙
-
-Ну что, начнём ⬇️"""
-    bot.send_message(cid, welcome_text)
+    sender.send_message(cid, render.WELCOME_TEXT)
 
     show_next_card(message)
 
 
-def show_next_card(message):
-    start_time = datetime.now()
-    cid = message.chat.id
-    user_id = message.from_user.id
+def build_card(user_id, defer=True):
+    """Готовит карточку: слово, варианты ответа и клавиатуру (в виде JSON). None, если слов нет
 
-    # Получаем случайное слово (будет оптимизировано в database.py)
-    word_data = db.get_random_word(user_id)
+    defer=False - для карточки про запас: слово отодвигается в очереди, только когда ее покажут.
+    """
+    # Версию берем до выбора слова, чтобы изменение словаря в это время сделало карточку устаревшей
+    version = db.get_vocabulary_version(user_id)
 
+    # Берем слово с ближайшим временем повторения
+    word_data = db.get_next_word(user_id, defer=defer)
     if not word_data:
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton(Command.ADD_WORD))
-        bot.send_message(cid, "Пока нет слов для изучения. Добавьте слова с помощью кнопки ниже:", reply_markup=markup)
-
-        log_user_action(user_id, "no_words_available")
-        return
+        return None
 
     # Получаем неправильные варианты (оптимизировано)
     wrong_options = db.get_wrong_options(word_data['word_id'], user_id, 3)
 
-    # Создаем клавиатуру
-    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-
     # Все варианты ответов
     all_options = [word_data['english_word']] + wrong_options
     random.shuffle(all_options)
 
-    # Добавляем кнопки вариантов
-    for option in all_options:
-        markup.add(types.KeyboardButton(option))
+    return {
+        'word_id': word_data['word_id'],
+        'english_word': word_data['english_word'],
+        'russian_translation': word_data['russian_translation'],
+        'options': all_options,
+        'markup': render.card_keyboard(all_options),
+        'version': version,
+    }
 
-    # Добавляем служебные кнопки
-    markup.add(
-        types.KeyboardButton(Command.NEXT),
-        types.KeyboardButton(Command.ADD_WORD),
-        types.KeyboardButton(Command.DELETE_WORD)
-    )
 
-    # Сохраняем состояние
-    bot.set_state(user_id, MyStates.target_word, cid)
+@metrics.timed_handler
+def prefetch_next_card(user_id, cid):
+    """Заранее готовит следующую карточку и кладет ее в состояние пользователя"""
+    try:
+        card = build_card(user_id, defer=False)
+        if card is None:
+            return
+        with bot.retrieve_data(user_id, cid) as data:
+            if data is not None:
+                data['next_card'] = card
+    except Exception as e:
+        print(f"Prefetch error: {e}")
+
+
+def schedule_prefetch(user_id, cid):
+    """Ставит подготовку следующей карточки в очередь чата - она выполнится, пока пользователь отвечает"""
+    if PREFETCH_NEXT_CARD and dispatcher is not None:
+        dispatcher.try_submit(cid, prefetch_next_card, user_id, cid)
+
+
+def show_next_card(message):
+    cid = message.chat.id
+    user_id = message.from_user.id
+
+    # Карточка, подготовленная в фоне, годится, только если словарь с тех пор не менялся
+    # Только чтение: без копии данных и записи, которые делает retrieve_data
+    card = (state_storage.get_data(cid, user_id, bot_id=bot.bot_id) or {}).get('next_card')
+    if card is not None and card.get('version') != db.get_vocabulary_version(user_id):
+        card = None
+    if card is not None:
+        db.mark_word_shown(user_id, card['word_id'])
+    else:
+        card = build_card(user_id)
+
+    if not card:
+        sender.send_message(cid, render.NO_WORDS_TEXT, reply_markup=render.NO_WORDS_KEYBOARD)
+
+        log_user_action(user_id, "no_words_available")
+        return
+
+    # Сохраняем состояние (при "Дальше" оно уже target_word - лишнюю запись не делаем)
+    if bot.get_state(user_id, cid) != MyStates.target_word.name:
+        bot.set_state(user_id, MyStates.target_word, cid)
     with bot.retrieve_data(user_id, cid) as data:
-        data['target_word'] = word_data['english_word']
-        data['translate_word'] = word_data['russian_translation']
-        data['options'] = all_options
+        data.pop('next_card', None)
+        data['word_id'] = card['word_id']
+        data['target_word'] = card['english_word']
+        data['translate_word'] = card['russian_translation']
+        data['options'] = card['options']
+        data['graded'] = False
 
-    response_time = int((datetime.now() - start_time).total_seconds() * 1000)
-    log_user_action(user_id, "show_card", f"word: {word_data['english_word']}")
+    log_user_action(user_id, "show_card", f"word: {card['english_word']}")
 
     # Отправляем вопрос
-    question = f"Выбери перевод слова:\n🇷🇺 {word_data['russian_translation']}"
-    bot.send_message(cid, question, reply_markup=markup)
+    sender.send_message(cid, render.question_text(card['russian_translation']), reply_markup=card['markup'])
+
+    schedule_prefetch(user_id, cid)
 
 
 @bot.message_handler(func=lambda message: message.text == Command.NEXT)
+@metrics.timed_handler
 def next_handler(message):
     log_user_action(message.from_user.id, "next_card")
     show_next_card(message)
 
 
 @bot.message_handler(func=lambda message: message.text == Command.ADD_WORD)
+@metrics.timed_handler
 def add_word_handler(message):
     log_user_action(message.from_user.id, "add_word_init")
     cid = message.chat.id
     user_id = message.from_user.id
 
-    bot.send_message(cid, "Введите слово на английском:")
+    sender.send_message(cid, "Введите слово на английском:")
     bot.set_state(user_id, MyStates.add_word_english, cid)
 
 
 @bot.message_handler(func=lambda message: message.text == Command.DELETE_WORD)
+@metrics.timed_handler
 def delete_word_handler(message):
     log_user_action(message.from_user.id, "delete_word_init")
     cid = message.chat.id
     user_id = message.from_user.id
 
-    bot.send_message(cid, "Введите английское слово, которое хотите удалить:")
+    sender.send_message(cid, "Введите английское слово, которое хотите удалить:")
     bot.set_state(user_id, MyStates.delete_word, cid)
 
 
 @bot.message_handler(state=MyStates.add_word_english)
+@metrics.timed_handler
 def process_english_word(message):
     cid = message.chat.id
     user_id = message.from_user.id
 
     english_word = message.text.strip()
     if not english_word:
-        bot.send_message(cid, "Слово не может быть пустым. Введите слово на английском:")
+        sender.send_message(cid, "Слово не может быть пустым. Введите слово на английском:")
         return
 
     with bot.retrieve_data(user_id, cid) as data:
         data['new_english_word'] = english_word
 
     log_user_action(user_id, "add_word_english", f"word: {english_word}")
-    bot.send_message(cid, "Теперь введите перевод на русском:")
+    sender.send_message(cid, "Теперь введите перевод на русском:")
     bot.set_state(user_id, MyStates.add_word_russian, cid)
 
 
 @bot.message_handler(state=MyStates.add_word_russian)
+@metrics.timed_handler
 def process_russian_word(message):
-    start_time = datetime.now()
     cid = message.chat.id
     user_id = message.from_user.id
 
     russian_word = message.text.strip()
     if not russian_word:
-        bot.send_message(cid, "Перевод не может быть пустым. Введите перевод на русском:")
+        sender.send_message(cid, "Перевод не может быть пустым. Введите перевод на русском:")
         return
 
     with bot.retrieve_data(user_id, cid) as data:
         english_word = data['new_english_word']
 
-    # Добавляем слово (оптимизированный метод)
-    if db.add_custom_word(user_id, english_word, russian_word):
-        # Получаем общее количество активных слов пользователя ОДНИМ запросом
-        words_count = db.get_user_active_words_count(user_id)
+    # Добавление и подсчет слов - в одной сессии и транзакции
+    with db.session_scope():
+        added = db.add_custom_word(user_id, english_word, russian_word)
+        words_count = db.get_user_active_words_count(user_id) if added else 0
 
-        response_time = int((datetime.now() - start_time).total_seconds() * 1000)
+    if added:
         log_user_action(user_id, "add_word_success", f"{english_word} -> {russian_word}")
 
-        bot.send_message(cid,
+        sender.send_message(cid,
                          f"✅ Слово '{english_word}' -> '{russian_word}' успешно добавлено!\n\n📚 Теперь вы изучаете: {words_count} слов")
     else:
-        response_time = int((datetime.now() - start_time).total_seconds() * 1000)
         log_user_action(user_id, "add_word_error", f"{english_word} -> {russian_word}")
-        bot.send_message(cid, "❌ Не удалось добавить слово. Попробуйте еще раз.")
+        sender.send_message(cid, "❌ Не удалось добавить слово. Попробуйте еще раз.")
 
     bot.delete_state(user_id, cid)
     show_next_card(message)
 
 
 @bot.message_handler(state=MyStates.delete_word)
+@metrics.timed_handler
 def process_delete_word(message):
-    start_time = datetime.now()
     cid = message.chat.id
     user_id = message.from_user.id
     word_to_delete = message.text.strip()
 
     if not word_to_delete:
-        bot.send_message(cid, "Слово не может быть пустым. Введите слово для удаления:")
+        sender.send_message(cid, "Слово не может быть пустым. Введите слово для удаления:")
         return
 
-    # Удаляем слово (оптимизированный метод)
-    if db.deactivate_user_word(user_id, word_to_delete):
-        # Получаем обновленное количество слов ОДНИМ запросом
-        words_count = db.get_user_active_words_count(user_id)
+    # Удаление и подсчет слов - в одной сессии и транзакции
+    with db.session_scope():
+        deleted = db.deactivate_user_word(user_id, word_to_delete)
+        words_count = db.get_user_active_words_count(user_id) if deleted else 0
 
-        response_time = int((datetime.now() - start_time).total_seconds() * 1000)
+    if deleted:
         log_user_action(user_id, "delete_word_success", f"word: {word_to_delete}")
 
-        bot.send_message(cid, f"✅ Слово '{word_to_delete}' удалено!\n\n📚 Теперь вы изучаете: {words_count} слов")
+        sender.send_message(cid, f"✅ Слово '{word_to_delete}' удалено!\n\n📚 Теперь вы изучаете: {words_count} слов")
     else:
-        response_time = int((datetime.now() - start_time).total_seconds() * 1000)
         log_user_action(user_id, "delete_word_error", f"word: {word_to_delete}")
-        bot.send_message(cid, f"❌ Слово '{word_to_delete}' не найдено.")
+        sender.send_message(cid, f"❌ Слово '{word_to_delete}' не найдено.")
 
     bot.delete_state(user_id, cid)
     show_next_card(message)
 
 
-@bot.message_handler(func=lambda message: True, content_types=['text'])
-def handle_answer(message):
-    start_time = datetime.now()
+@bot.message_handler(content_types=['document'])
+@metrics.timed_handler
+def import_words(message):
+    """Добавляет слова из присланного CSV/TSV файла: английское слово и перевод в каждой строке"""
     cid = message.chat.id
     user_id = message.from_user.id
-    user_answer = message.text
+    document = message.document
 
-    # Игнорируем команды
-    if user_answer in [Command.NEXT, Command.ADD_WORD, Command.DELETE_WORD]:
+    file_name = (document.file_name or '').lower()
+    if not file_name.endswith(('.csv', '.tsv', '.txt')):
+        sender.send_message(cid, "❌ Пришлите файл .csv или .tsv: в каждой строке слово на английском и перевод")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_MB * 1024 * 1024:
+        sender.send_message(cid, f"❌ Файл больше {IMPORT_MAX_FILE_MB} МБ")
         return
 
-    with bot.retrieve_data(user_id, cid) as data:
-        if not data or 'target_word' not in data:
-            show_next_card(message)
-            return
-
-        target_word = data['target_word']
-        translate_word = data['translate_word']
-        options = data['options']
-
-        if user_answer == target_word:
-            # Правильный ответ
-            response = f"✅ Отлично! Правильно!\n{show_target(data)}"
-            log_user_action(user_id, "correct_answer", f"word: {target_word}")
-
-            # Создаем клавиатуру для следующего действия
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.add(
-                types.KeyboardButton(Command.NEXT),
-                types.KeyboardButton(Command.ADD_WORD),
-                types.KeyboardButton(Command.DELETE_WORD)
-            )
-
-            response_time = int((datetime.now() - start_time).total_seconds() * 1000)
-            bot.send_message(cid, response, reply_markup=markup)
-
-        else:
-            # Неправильный ответ
-            response = f"❌ Неправильно! Попробуйте ещё раз вспомнить слово:\n🇷🇺 {translate_word}"
-            log_user_action(user_id, "wrong_answer", f"word: {target_word}, answer: {user_answer}")
-
-            # Создаем ту же клавиатуру, но помечаем неправильный ответ
-            markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-
-            # Обновляем кнопки, помечая неправильный ответ
-            new_buttons = []
-            for option in options:
-                if option == user_answer:
-                    new_buttons.append(types.KeyboardButton(option + ' ❌'))
-                else:
-                    new_buttons.append(types.KeyboardButton(option))
-
-            random.shuffle(new_buttons)
-
-            # Добавляем служебные кнопки
-            for btn in new_buttons:
-                markup.add(btn)
-
-            markup.add(
-                types.KeyboardButton(Command.NEXT),
-                types.KeyboardButton(Command.ADD_WORD),
-                types.KeyboardButton(Command.DELETE_WORD)
-            )
+    data = bot.download_file(bot.get_file(document.file_id).file_path)
+    stats = word_import.ImportStats()
+    result = db.import_custom_words(
+        user_id,
+        word_import.iter_word_pairs(word_import.open_upload(data), stats),
+        batch_size=IMPORT_BATCH_SIZE
+    )
 
-            # Сохраняем состояние для повторной попытки
-            bot.set_state(user_id, MyStates.target_word, cid)
-            with bot.retrieve_data(user_id, cid) as data:
-                data['target_word'] = target_word
-                data['translate_word'] = translate_word
-                data['options'] = [btn.text.replace(' ❌', '') for btn in new_buttons if '❌' not in btn.text]
+    log_user_action(user_id, "import_words",
+                    f"file: {document.file_name}, added: {result['added']}, rows: {stats.rows}")
 
-            response_time = int((datetime.now() - start_time).total_seconds() * 1000)
-            bot.send_message(cid, response, reply_markup=markup)
+    summary = (f"📥 Импорт завершен\n\n"
+               f"✅ Добавлено: {result['added']}\n"
+               f"🔁 Уже были в словаре: {result['duplicates']}")
+    if result['over_limit']:
+        summary += f"\n⛔ Не вошли в лимит {MAX_WORDS_PER_USER} слов: {result['over_limit']}"
+    if stats.invalid:
+        summary += f"\n⚠ Строк с ошибками: {stats.invalid}"
+    sender.send_message(cid, summary)
 
 
 @bot.message_handler(commands=['stats'])
+@metrics.timed_handler
 def show_stats(message):
     """Показывает статистику пользователя"""
     try:
         user_id = message.from_user.id
 
+        # Точность и выученные слова - из счетчиков прогресса в памяти
+        progress = db.get_progress_summary(user_id)
+        progress_text = ""
+        if progress and progress['answers']:
+            progress_text = (
+                f"🎯 Точность: {progress['accuracy']:.0%} ({progress['correct']} из {progress['answers']} ответов)\n"
+                f"🏆 Выучено слов: {progress['mastered']} из {db.get_user_active_words_count(user_id)}\n"
+                f"🔥 Лучшая серия: {progress['best_streak']}\n\n"
+            )
+
         # ОДИН оптимизированный запрос для всей статистики
         user_stats = db.get_user_activity_report(user_id, days=30)
 
         if user_stats:
-            stats_text = "📊 Ваша активность за 30 дней:\n\n"
+            stats_text = progress_text + "📊 Ваша активность за 30 дней:\n\n"
             total_requests = sum(stat['request_count'] for stat in user_stats)
 
             stats_text += f"📨 Всего действий: {total_requests}\n\n"
@@ -343,25 +421,224 @@ def show_stats(message):
             if len(user_stats) > 10:
                 stats_text += f"\n... и еще {len(user_stats) - 10} типов действий"
 
+        elif progress_text:
+            stats_text = progress_text.rstrip()
         else:
             stats_text = "📊 У вас пока нет активности для отображения"
 
-        bot.send_message(message.chat.id, stats_text)
+        sender.send_message(message.chat.id, stats_text)
         log_user_action(user_id, "view_stats")
 
     except Exception as e:
-        bot.send_message(message.chat.id, "❌ Ошибка получения статистики")
+        sender.send_message(message.chat.id, "❌ Ошибка получения статистики")
         print(f"Stats error: {e}")
 
 
+def format_pool_status(status):
+    """Строка о пуле соединений БД: загрузка и ожидание свободного соединения"""
+    if 'saturation' not in status:
+        return f"Пул соединений: {status['pool']}"
+    line = (f"Пул соединений: занято {status['checked_out']} из {status['size']}, "
+            f"загрузка {status['saturation']:.0%}")
+    if 'checkouts' in status:
+        line += (f", ожидание avg {status['avg_wait_ms']:.1f} / max {status['max_wait_ms']:.1f} мс, "
+                 f"пик {status['peak_checked_out']}, таймаутов {status['timeouts']}")
+    return line
+
+
+@bot.message_handler(commands=['latency'], func=lambda message: message.from_user.id in ADMIN_IDS)
+@metrics.timed_handler
+def show_latency(message):
+    """Показывает администратору перцентили времени ответа по хендлерам"""
+    report = metrics.snapshot()
+    if not report:
+        sender.send_message(message.chat.id, "⏱ Замеров пока нет")
+        return
+
+    lines = ["⏱ Время ответа, мс (p50 / p95 / p99), из них в БД:\n"]
+    for name, stats in report.items():
+        lines.append(
+            f"• {name} ({stats['calls']}): "
+            f"{stats['wall_p50_ms']:.1f} / {stats['wall_p95_ms']:.1f} / {stats['wall_p99_ms']:.1f}, "
+            f"БД {stats['db_p50_ms']:.1f} / {stats['db_p95_ms']:.1f} / {stats['db_p99_ms']:.1f}"
+        )
+    lines.append("\n" + format_pool_status(db.pool_status()))
+    sender.send_message(message.chat.id, "\n".join(lines))
+
+
+@bot.message_handler(commands=['queries'], func=lambda message: message.from_user.id in ADMIN_IDS)
+@metrics.timed_handler
+def show_queries(message):
+    """Показывает администратору SQL-запросы по хендлерам и самые частые отпечатки запросов"""
+    if query_guard.mode == 'off':
+        sender.send_message(message.chat.id, "🔍 Учет запросов выключен (QUERY_GUARD=off)")
+        return
+    sender.send_message(message.chat.id, query_guard.format_report(top=5)[:4000])
+
+
+@bot.message_handler(commands=['export'], func=lambda message: message.from_user.id in ADMIN_IDS)
+@metrics.timed_handler
+def export_data(message):
+    """Выгружает администратору журнал действий или словари файлом: /export [activity|vocabulary] [csv|ndjson]"""
+    args = message.text.split()[1:]
+    dataset = args[0] if args else 'activity'
+    fmt = args[1] if len(args) > 1 else 'csv'
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        sender.send_message(message.chat.id,
+                            f"Использование: /export [{'|'.join(export.DATASETS)}] [{'|'.join(export.FORMATS)}]")
+        return
+
+    sender.send_message(message.chat.id, f"⏳ Выгружаю {dataset}...")
+    path, rows = export.export_to_file(db.engine, dataset, fmt, chunk_size=EXPORT_CHUNK_SIZE)
+    try:
+        if not rows:
+            sender.send_message(message.chat.id, "📭 Нет данных для выгрузки")
+            return
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        if size_mb > EXPORT_MAX_DOCUMENT_MB:
+            sender.send_message(message.chat.id,
+                                f"❌ Файл {size_mb:.1f} МБ больше лимита {EXPORT_MAX_DOCUMENT_MB} МБ, "
+                                f"выгрузите его через export.export_to_file на сервере")
+            return
+        # Через очередь отправки: файл уходит после уже поставленных в чат сообщений и с учетом лимитов
+        with open(path, 'rb') as document:
+            content = document.read()
+    finally:
+        os.remove(path)
+    sender.send_document(message.chat.id, content, caption=f"📦 {dataset}: {rows} строк",
+                         visible_file_name=f"{dataset}.{fmt}")
+
+
+@bot.message_handler(func=lambda message: True, content_types=['text'])
+@metrics.timed_handler
+def handle_answer(message):
+    cid = message.chat.id
+    user_id = message.from_user.id
+    user_answer = message.text
+
+    # Игнорируем команды
+    if user_answer in [Command.NEXT, Command.ADD_WORD, Command.DELETE_WORD]:
+        return
+
+    # Нет текущей карточки - показываем новую. Вне retrieve_data: при выходе из блока
+    # он записал бы прежние (пустые) данные поверх только что сохраненной карточки
+    if 'target_word' not in (state_storage.get_data(cid, user_id, bot_id=bot.bot_id) or {}):
+        show_next_card(message)
+        return
+
+    with bot.retrieve_data(user_id, cid) as data:
+        target_word = data['target_word']
+        translate_word = data['translate_word']
+        options = data['options']
+
+        # В расписание идет только первая попытка по карточке
+        if not data.get('graded') and 'word_id' in data:
+            db.record_answer(user_id, data['word_id'], user_answer == target_word)
+            data['graded'] = True
+
+        if user_answer == target_word:
+            # Правильный ответ
+            log_user_action(user_id, "correct_answer", f"word: {target_word}")
+            sender.send_message(cid, render.correct_text(target_word, translate_word),
+                                reply_markup=render.SERVICE_KEYBOARD)
+
+        else:
+            # Неправильный ответ
+            log_user_action(user_id, "wrong_answer", f"word: {target_word}, answer: {user_answer}")
+
+            # Та же клавиатура в новом порядке, неправильный ответ помечен
+            options = list(options)
+            random.shuffle(options)
+            markup = render.card_keyboard(options, wrong=user_answer)
+
+            # Для повторной попытки остаются варианты без неправильного (в том же состоянии, без вложенного retrieve_data)
+            data['options'] = [option for option in options if option != user_answer]
+
+            sender.send_message(cid, render.wrong_text(translate_word), reply_markup=markup)
+
+
 # Добавляем фильтры состояний
 bot.add_custom_filter(custom_filters.StateFilter(bot))
 
 if __name__ == '__main__':
     print("✓ Bot starting with SQLAlchemy ORM...")
+    if BOT_MODE == 'webhook' and not WEBHOOK_SECRET:
+        print("ERROR: Set WEBHOOK_SECRET: without it anyone reaching the webhook port can forge updates")
+        exit(1)
+    # Схема обновляется явно (python manage.py migrate); при запуске - только проверка версии
+    if AUTO_MIGRATE:
+        migrations.upgrade(db)
+    else:
+        migrations.check(db)
+    if dispatcher:
+        dispatcher.start()
+        print(f"✓ Dispatcher started with {DISPATCH_WORKERS} workers")
+    if hasattr(state_storage, 'start_sweeper'):
+        state_storage.start_sweeper(interval=STATE_SWEEP_INTERVAL)
+    # Партиции журнала на месяцы вперед и удаление устаревших
+    db.partitions.start_background(interval=PARTITION_MAINTENANCE_INTERVAL)
+    # Прогресс по словам пишется в БД пачками раз в PROGRESS_CHECKPOINT_INTERVAL секунд
+    db.progress.start_background(interval=PROGRESS_CHECKPOINT_INTERVAL)
+    webhook = None
     try:
-        bot.infinity_polling(timeout=60, long_polling_timeout=30, skip_pending=True)
+        if BOT_MODE == 'webhook':
+            webhook = WebhookServer(
+                bot,
+                host=WEBHOOK_HOST,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                queue_size=WEBHOOK_QUEUE_SIZE,
+                batch_size=WEBHOOK_BATCH_SIZE
+            )
+            port = webhook.start()
+            if WEBHOOK_URL:
+                bot.set_webhook(url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+            print(f"✓ Webhook server listening on {WEBHOOK_HOST}:{port}{WEBHOOK_PATH}")
+
+            # Работаем до Ctrl+C или SIGTERM
+            stopped = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+            try:
+                while not stopped.wait(1):
+                    pass
+            except KeyboardInterrupt:
+                pass
+        else:
+            bot.infinity_polling(timeout=60, long_polling_timeout=30, skip_pending=True)
     except Exception as e:
         print(f"✗ Bot stopped with error: {e}")
     finally:
+        if webhook:
+            # Сначала перестаем принимать запросы и передаем принятые обновления диспетчеру
+            webhook.stop()
+            webhook_stats = webhook.stats()
+            print(f"✓ Webhook drained: processed={webhook_stats['processed']}, batches={webhook_stats['batches']}")
+        if dispatcher:
+            # Дорабатываем уже принятые обновления до остановки логгера
+            dispatcher.stop()
+        if hasattr(state_storage, 'stop_sweeper'):
+            state_storage.stop_sweeper()
+        db.partitions.stop_background()
+        if sender is not bot:
+            # Отправляем ответы, оставшиеся в очереди
+            sender.stop()
+            send_stats = sender.stats()
+            print(f"✓ Send queue drained: sent={send_stats['sent']}, failed={send_stats['failed']}")
+        # Последняя контрольная точка прогресса - после того, как все ответы обработаны
+        try:
+            print(f"✓ Progress checkpoint: {db.progress.stop_background()} rows written")
+        except Exception as e:
+            print(f"✗ Progress checkpoint failed: {e}")
+        # Дописываем накопленные логи перед выходом
+        request_log.stop()
+        log_stats = request_log.stats()
+        print(f"✓ Request log flushed: written={log_stats['written']}, dropped={log_stats['dropped']}")
+        pool = db.pool_status()
+        if 'checkouts' in pool:
+            print(f"✓ DB pool: checkouts={pool['checkouts']}, avg_wait={pool['avg_wait_ms']:.1f}ms, "
+                  f"max_wait={pool['max_wait_ms']:.1f}ms, peak={pool['peak_checked_out']}/{pool['size']}, "
+                  f"timeouts={pool['timeouts']}")
+        if query_guard.mode != 'off' and QUERY_GUARD_DEBUG:
+            print(query_guard.format_report())
         print("✓ Bot stopped gracefully")
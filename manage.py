@@ -0,0 +1,70 @@
+"""Служебные команды бота
+
+    python manage.py migrate [--status] [--target N]
+    python manage.py backfill-rollups [--batch-size N]
+    python manage.py partitions
+    python manage.py build-similarity [--output PATH] [--neighbors K]
+"""
+import argparse
+
+from config import SIMILARITY_INDEX_PATH, SIMILARITY_NEIGHBORS
+from database import db
+import migrations
+from similarity import build_index
+
+
+def migrate(args):
+    version = migrations.current_version(db.engine)
+    if args.status:
+        print(f"Schema version: {version} (latest {migrations.LATEST_VERSION})")
+        for migration in migrations.MIGRATIONS:
+            mark = '✓' if migration.version <= version else ' '
+            print(f"  [{mark}] {migration.version} {migration.name}")
+        return
+    applied = migrations.upgrade(db, target=args.target)
+    print(f"✓ Schema version: {migrations.current_version(db.engine)}" + ('' if applied else ' (up to date)'))
+
+
+def backfill_rollups(args):
+    processed = db.backfill_activity_rollups(batch_size=args.batch_size)
+    print(f"✓ Rollups rebuilt: {processed} user_requests rows processed")
+
+
+def maintain_partitions(args):
+    created, removed = db.partitions.run_maintenance()
+    print(f"✓ Partitions created: {', '.join(created) or 'none'}")
+    print(f"✓ Retention applied: {', '.join(removed) or 'nothing to remove'}")
+
+
+def build_similarity(args):
+    words = build_index(db.iter_dictionary_words(), args.output, k=args.neighbors)
+    print(f"✓ Similarity index written to {args.output}: {words} words")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = commands.add_parser('migrate', help='создать или обновить схему БД')
+    migrate_parser.add_argument('--status', action='store_true', help='показать версию схемы и миграции')
+    migrate_parser.add_argument('--target', type=int, help='применить миграции только до этой версии')
+    migrate_parser.set_defaults(func=migrate)
+
+    backfill = commands.add_parser('backfill-rollups', help='пересчитать дневные агрегаты по всему журналу')
+    backfill.add_argument('--batch-size', type=int, default=10000)
+    backfill.set_defaults(func=backfill_rollups)
+
+    partitions = commands.add_parser('partitions', help='создать будущие партиции user_requests и применить срок хранения')
+    partitions.set_defaults(func=maintain_partitions)
+
+    similarity = commands.add_parser('build-similarity', help='построить индекс похожих слов для вариантов ответа')
+    similarity.add_argument('--output', default=SIMILARITY_INDEX_PATH)
+    similarity.add_argument('--neighbors', type=int, default=SIMILARITY_NEIGHBORS)
+    similarity.set_defaults(func=build_similarity)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import functools
+import threading
+import time
+from array import array
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Гистограмма: значения < SUB_BUCKETS хранятся точно, дальше - с точностью ~3%
+SUB_BUCKETS = 64
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+MAX_EXPONENT = 40  # до 2**45 мкс - с большим запасом
+
+
+class LatencyHistogram:
+    """Гистограмма задержек в стиле HDR: логарифмические диапазоны с линейными поддиапазонами
+
+    Запись - O(1) без выделения памяти, размер фиксирован независимо от числа замеров.
+    Значения в микросекундах.
+    """
+
+    def __init__(self):
+        self.counts = array('Q', [0]) * (SUB_BUCKETS + MAX_EXPONENT * HALF_SUB_BUCKETS)
+        self.total = 0
+        self.max_value = 0
+
+    @staticmethod
+    def _index(value):
+        if value < SUB_BUCKETS:
+            return value
+        exponent = value.bit_length() - 6
+        mantissa = value >> exponent  # 32..63
+        return SUB_BUCKETS + (exponent - 1) * HALF_SUB_BUCKETS + (mantissa - HALF_SUB_BUCKETS)
+
+    @staticmethod
+    def _value(index):
+        """Верхняя граница диапазона бакета"""
+        if index < SUB_BUCKETS:
+            return index
+        exponent, offset = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+        exponent += 1
+        return ((offset + HALF_SUB_BUCKETS + 1) << exponent) - 1
+
+    def record(self, value_us):
+        value_us = max(int(value_us), 0)
+        index = min(self._index(value_us), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        if value_us > self.max_value:
+            self.max_value = value_us
+
+    def percentile(self, pct):
+        """Значение перцентиля pct (0..100) в микросекундах"""
+        if not self.total:
+            return 0
+        target = max(1, int(self.total * pct / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value(index), self.max_value)
+        return self.max_value
+
+    def percentiles_ms(self):
+        """{'p50_ms', 'p95_ms', 'p99_ms'} - для stats() очередей"""
+        return {f'p{pct}_ms': self.percentile(pct) / 1000 for pct in (50, 95, 99)}
+
+
+class HandlerStats:
+    __slots__ = ('wall', 'db', 'calls', 'errors', 'lock')
+
+    def __init__(self):
+        self.wall = LatencyHistogram()
+        self.db = LatencyHistogram()
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+class HandlerContext:
+    """Замеры текущего вызова хендлера"""
+    __slots__ = ('name', 'started', 'db_ns', 'on_finish')
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter_ns()
+        self.db_ns = 0
+        self.on_finish = []  # колбэки (response_time_ms) после завершения хендлера
+
+
+_current = ContextVar('handler_context', default=None)
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def current_context():
+    """Контекст выполняющегося хендлера или None вне хендлера"""
+    return _current.get()
+
+
+def _stats_for(name):
+    stats = _registry.get(name)
+    if stats is None:
+        with _registry_lock:
+            stats = _registry.setdefault(name, HandlerStats())
+    return stats
+
+
+def timed_handler(func):
+    """Замеряет время хендлера (монотонные часы) и время, проведенное им в БД"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current.get() is not None:
+            # Хендлер вызван из другого хендлера - время уже учитывается внешним
+            return func(*args, **kwargs)
+
+        context = HandlerContext(func.__name__)
+        token = _current.set(context)
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _current.reset(token)
+            wall_ns = time.perf_counter_ns() - context.started
+
+            stats = _stats_for(context.name)
+            with stats.lock:
+                stats.calls += 1
+                stats.errors += failed
+                stats.wall.record(wall_ns // 1000)
+                stats.db.record(context.db_ns // 1000)
+
+            response_time = wall_ns // 1_000_000
+            for callback in context.on_finish:
+                try:
+                    callback(response_time)
+                except Exception as e:
+                    print(f"Handler finish callback error: {e}")
+
+    return wrapper
+
+
+def install_db_timing(engine):
+    """Подключает учет времени SQL-запросов к текущему хендлеру"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter_ns())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        handler = _current.get()
+        if handler is not None:
+            handler.db_ns += time.perf_counter_ns() - started
+
+
+def snapshot():
+    """Перцентили по хендлерам в миллисекундах"""
+    with _registry_lock:
+        items = list(_registry.items())
+
+    result = {}
+    for name, stats in sorted(items):
+        with stats.lock:
+            result[name] = {
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'wall_p50_ms': stats.wall.percentile(50) / 1000,
+                'wall_p95_ms': stats.wall.percentile(95) / 1000,
+                'wall_p99_ms': stats.wall.percentile(99) / 1000,
+                'db_p50_ms': stats.db.percentile(50) / 1000,
+                'db_p95_ms': stats.db.percentile(95) / 1000,
+                'db_p99_ms': stats.db.percentile(99) / 1000,
+            }
+    return result
+
+
+def reset():
+    with _registry_lock:
+        _registry.clear()
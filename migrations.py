@@ -0,0 +1,198 @@
+"""Версионированные миграции схемы БД
+
+Схема больше не создается при импорте database.py: ее обновляет явная
+команда `python manage.py migrate` (или бот при AUTO_MIGRATE=true). Номер
+последней примененной миграции хранится в таблице schema_version.
+
+Каждая миграция идемпотентна (IF NOT EXISTS, проверка колонок), поэтому
+прерванный посередине шаг безопасно выполнить повторно, а базы, созданные
+до появления миграций через create_all, доводятся до текущей схемы.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.sql import func
+
+from database import UserRequest, UserWord, Word, WordProgress
+from vocabulary import word_key
+
+Migration = namedtuple('Migration', ['version', 'name', 'apply'])
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100)),
+    Column('applied_at', DateTime, default=func.now()),
+)
+
+# Ключ pg_advisory_lock: два процесса не применяют миграции одновременно
+ADVISORY_LOCK_KEY = 7_341_020_019
+
+
+def _initial_schema(db):
+    """Таблицы моделей (user_requests в PostgreSQL - секционированная) и общие слова"""
+    db.create_tables()
+    with db.engine.connect() as conn:
+        columns = {column['name'] for column in inspect(conn).get_columns(Word.__tablename__)}
+    # В старой базе words еще без normalized_key: общие слова добавит миграция 2
+    if 'normalized_key' in columns:
+        db.seed_common_words()
+    db.load_common_words()
+
+
+def _words_normalized_key(db, batch_size=5000):
+    """words.normalized_key для баз, где слова еще хранились отдельно у каждого пользователя
+
+    Одинаковые пары сливаются в строку с меньшим id, ссылки user_words
+    переводятся на нее (если у пользователя уже есть эта строка - дубль
+    связи удаляется), затем ключ становится уникальным.
+    """
+    with db.engine.begin() as conn:
+        columns = {column['name'] for column in inspect(conn).get_columns(Word.__tablename__)}
+        added = 'normalized_key' not in columns
+        if added:
+            conn.execute(text("ALTER TABLE words ADD COLUMN normalized_key VARCHAR(255)"))
+
+    with db.engine.begin() as conn:
+        keepers = {}      # normalized_key -> words.id, который остается
+        duplicates = []   # {'dup': id дубля, 'keeper': id оставшейся строки}
+        missing = []      # строки без ключа
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(Word.id, Word.english_word, Word.russian_translation, Word.normalized_key)
+                .where(Word.id > last_id)
+                .order_by(Word.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                key = row.normalized_key or word_key(row.english_word, row.russian_translation)
+                keeper = keepers.setdefault(key, row.id)
+                if keeper != row.id:
+                    duplicates.append({'dup': row.id, 'keeper': keeper})
+                elif row.normalized_key is None:
+                    missing.append({'word_id': row.id, 'key': key})
+
+        if duplicates:
+            conn.execute(text(
+                "DELETE FROM user_words WHERE word_id = :dup AND user_id IN "
+                "(SELECT user_id FROM user_words WHERE word_id = :keeper)"
+            ), duplicates)
+            conn.execute(text("UPDATE user_words SET word_id = :keeper WHERE word_id = :dup"), duplicates)
+            conn.execute(text("DELETE FROM words WHERE id = :dup"), duplicates)
+        if missing:
+            conn.execute(text("UPDATE words SET normalized_key = :key WHERE id = :word_id"), missing)
+        if added:
+            # В новой базе уникальность задает сама модель (create_all)
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_words_normalized_key ON words (normalized_key)"
+            ))
+
+    if duplicates or missing:
+        print(f"✓ words: {len(missing)} keys backfilled, {len(duplicates)} duplicate pairs merged")
+    db.seed_common_words()
+    db.load_common_words()
+    db.vocabulary.pools.clear()
+
+
+def _user_requests_indexes(db):
+    """Индексы журнала под отчеты и срок хранения (в секционированной таблице они уже есть)"""
+    with db.engine.begin() as conn:
+        for index in UserRequest.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _word_progress(db):
+    """Таблица счетчиков прогресса по словам (progress.py)"""
+    WordProgress.__table__.create(db.engine, checkfirst=True)
+
+
+def _user_words_schedule(db):
+    """Колонки расписания SM-2 в user_words и индекс очереди (user_id, due_at) для баз, созданных до них
+
+    Существующие строки получают значения по умолчанию модели, как у слова,
+    которое еще не показывалось (due_at NULL).
+    """
+    table = UserWord.__table__
+    with db.engine.begin() as conn:
+        columns = {column['name'] for column in inspect(conn).get_columns(table.name)}
+        quote = conn.dialect.identifier_preparer.quote
+        for name in ('ease', 'interval', 'repetitions', 'due_at'):
+            if name in columns:
+                continue
+            column = table.c[name]
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {quote(name)} {column.type.compile(dialect=conn.dialect)}"
+            if column.default is not None:
+                ddl += f" DEFAULT {column.default.arg!r}"
+            conn.execute(text(ddl))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    db.vocabulary.pools.clear()
+
+
+MIGRATIONS = (
+    Migration(1, 'initial schema', _initial_schema),
+    Migration(2, 'words.normalized_key', _words_normalized_key),
+    Migration(3, 'user_requests indexes', _user_requests_indexes),
+    Migration(4, 'word_progress', _word_progress),
+    Migration(5, 'user_words schedule', _user_words_schedule),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(engine):
+    """Номер последней примененной миграции; 0 для пустой базы"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(schema_version.name):
+            return 0
+        return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def pending(db):
+    version = current_version(db.engine)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def upgrade(db, target=None):
+    """Применяет миграции новее текущей версии (до target включительно). Возвращает примененные"""
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    with db.engine.connect() as lock_conn:
+        postgres = lock_conn.dialect.name == 'postgresql'
+        if postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            schema_version.create(db.engine, checkfirst=True)
+            for migration in pending(db):
+                if migration.version > target:
+                    break
+                started = datetime.now()
+                migration.apply(db)
+                with db.engine.begin() as conn:
+                    conn.execute(insert(schema_version).values(version=migration.version, name=migration.name))
+                print(f"✓ Migration {migration.version} ({migration.name}) applied "
+                      f"in {(datetime.now() - started).total_seconds():.2f}s")
+                applied.append(migration)
+        finally:
+            if postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+                lock_conn.commit()
+    return applied
+
+
+def check(db):
+    """Предупреждает при запуске бота о непримененных миграциях; недоступная БД не мешает старту"""
+    try:
+        missing = pending(db)
+    except Exception as e:
+        print(f"⚠ Schema version check failed, database is unavailable: {e}")
+        return None
+    if missing:
+        print(f"⚠ Database schema is behind: {len(missing)} pending migrations, run `python manage.py migrate`")
+    return missing
@@ -0,0 +1,186 @@
+import re
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+TABLE = 'user_requests'
+PARTITION_NAME = re.compile(r'^user_requests_p(\d{4})(\d{2})$')
+
+RETENTION_DROP = 'drop'      # удалить старую партицию целиком
+RETENTION_DETACH = 'detach'  # отсоединить и оставить как архивную таблицу
+
+# Родительская таблица в PostgreSQL: колонки как у модели UserRequest, ключ включает created_at
+PARTITIONED_TABLE_DDL = f"""
+CREATE TABLE {TABLE} (
+    id SERIAL,
+    user_id INTEGER REFERENCES users (id),
+    provider VARCHAR(50),
+    query TEXT,
+    response_time INTEGER,
+    success BOOLEAN,
+    error_message TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at)
+"""
+
+PARTITIONED_INDEXES_DDL = (
+    f"CREATE INDEX IF NOT EXISTS ix_user_requests_user_created ON {TABLE} (user_id, created_at)",
+    f"CREATE INDEX IF NOT EXISTS ix_user_requests_created ON {TABLE} (created_at)",
+    # Строки вне созданных месяцев не теряются, а попадают сюда
+    f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT",
+)
+
+
+def month_start(day, shift=0):
+    """Первое число месяца day, сдвинутого на shift месяцев"""
+    month_index = day.year * 12 + day.month - 1 + shift
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class PartitionManager:
+    """Помесячные партиции журнала user_requests и политика хранения
+
+    В PostgreSQL таблица секционирована по created_at: партиции создаются
+    заранее, а старые удаляются или отсоединяются целиком, без построчного
+    DELETE. В остальных СУБД (SQLite) таблица обычная, а хранение
+    ограничивается одним DELETE по индексу created_at.
+    """
+
+    def __init__(self, engine, months_ahead=3, retention_months=12, retention_mode=RETENTION_DROP):
+        if retention_mode not in (RETENTION_DROP, RETENTION_DETACH):
+            raise ValueError(f"Unknown retention mode: {retention_mode}")
+        self.engine = engine
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.retention_mode = retention_mode
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def partitioned(self):
+        return self.engine.dialect.name == 'postgresql'
+
+    def create_table(self):
+        """Создает секционированную user_requests в PostgreSQL, если таблицы еще нет
+
+        Возвращает False, если таблица уже существует как обычная (ее нужно
+        перенести вручную) или СУБД не поддерживает секционирование.
+        """
+        if not self.partitioned:
+            return False
+
+        with self.engine.begin() as conn:
+            kind = conn.execute(
+                text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:name)"),
+                {'name': TABLE}
+            ).scalar()
+            if kind == 'r':
+                print(f"⚠ {TABLE} is a plain table; partitioning requires a manual migration")
+                return False
+            if kind is None:
+                conn.execute(text(PARTITIONED_TABLE_DDL))
+            for statement in PARTITIONED_INDEXES_DDL:
+                conn.execute(text(statement))
+
+        self.ensure_partitions()
+        return True
+
+    def ensure_partitions(self, today=None):
+        """Создает партиции с текущего месяца на months_ahead месяцев вперед"""
+        if not self.partitioned:
+            return []
+
+        today = today or datetime.now().date()
+        created = []
+        for shift in range(self.months_ahead + 1):
+            lower = month_start(today, shift)
+            upper = month_start(today, shift + 1)
+            name = f"{TABLE}_p{lower:%Y%m}"
+            try:
+                with self.engine.begin() as conn:
+                    exists = conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar()
+                    if exists:
+                        continue
+                    conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {TABLE} "
+                        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+                    ))
+                created.append(name)
+            except Exception as e:
+                # Например, в DEFAULT-партиции уже есть строки за этот месяц
+                print(f"Partition {name} was not created: {e}")
+        return created
+
+    def list_partitions(self):
+        """Возвращает [(имя, первое число месяца)] месячных партиций"""
+        if not self.partitioned:
+            return []
+        with self.engine.connect() as conn:
+            names = conn.execute(text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :table"
+            ), {'table': TABLE}).scalars().all()
+
+        partitions = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda item: item[1])
+
+    def apply_retention(self, today=None):
+        """Удаляет (или архивирует) данные старше retention_months месяцев"""
+        if not self.retention_months:
+            return []
+
+        today = today or datetime.now().date()
+        cutoff = month_start(today, -self.retention_months)
+
+        if not self.partitioned:
+            with self.engine.begin() as conn:
+                deleted = conn.execute(text(f"DELETE FROM {TABLE} WHERE created_at < :cutoff"), {'cutoff': cutoff}).rowcount
+            return [f"{TABLE}: {deleted} rows"] if deleted else []
+
+        removed = []
+        for name, lower in self.list_partitions():
+            if month_start(lower, 1) > cutoff:
+                continue
+            with self.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+                if self.retention_mode == RETENTION_DROP:
+                    conn.execute(text(f"DROP TABLE {name}"))
+                else:
+                    conn.execute(text(f"ALTER TABLE {name} RENAME TO {TABLE}_archive_{lower:%Y%m}"))
+            removed.append(name)
+        return removed
+
+    def run_maintenance(self):
+        """Создает будущие партиции и применяет политику хранения"""
+        created = self.ensure_partitions()
+        removed = self.apply_retention()
+        return created, removed
+
+    def start_background(self, interval=86400):
+        """Периодически выполняет run_maintenance в фоновом потоке"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while True:
+                try:
+                    self.run_maintenance()
+                except Exception as e:
+                    print(f"Partition maintenance error: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=run, name='PartitionMaintenance', daemon=True)
+        self._thread.start()
+
+    def stop_background(self):
+        self._stop.set()
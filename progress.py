@@ -0,0 +1,288 @@
+"""Прогресс пользователей по словам: точность, серии правильных ответов и сложность
+
+Счетчики пользователя лежат в плотных массивах (индекс слова в массивах -
+его позиция в UserProgress.slots), поэтому ответ учитывается за O(1), а
+итоги для /stats (точность, выученные слова, лучшая серия) обновляются
+вместе со счетчиками и не требуют ни прохода по словам, ни агрегирующих
+запросов. Прогресс пользователя читается из word_progress одним запросом
+по индексу при первом обращении.
+
+Измененные строки копятся в памяти и периодически сбрасываются в БД
+пачками (контрольные точки). В строке - абсолютные значения счетчиков,
+поэтому повтор пачки после ошибки ничего не портит. При падении процесса
+теряется не больше одного интервала между контрольными точками.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from cache import LoadLocks
+
+MAX_STREAK = 0xFFFF  # предел array('H')
+
+
+def interval_factor(correct, wrong, weight=1.0):
+    """Множитель времени до следующего показа: чем чаще ошибки по слову, тем раньше оно вернется
+
+    Без ошибок - 1 (чистый SM-2); все ответы неправильные - около 1 / (1 + weight).
+    """
+    return 1.0 / (1.0 + weight * wrong / (correct + wrong + 1))
+
+
+class UserProgress:
+    """Счетчики одного пользователя по словам"""
+    __slots__ = ('mastered_streak', 'slots', 'word_ids', 'correct', 'wrong', 'streak', 'best_streak',
+                 'answered_at', 'active', 'dirty', 'answers', 'correct_answers', 'mastered', 'best')
+
+    def __init__(self, mastered_streak=3):
+        self.mastered_streak = mastered_streak
+        self.slots = {}                 # word_id -> индекс в массивах
+        self.word_ids = array('q')
+        self.correct = array('I')
+        self.wrong = array('I')
+        self.streak = array('H')        # правильных ответов подряд
+        self.best_streak = array('H')
+        self.answered_at = array('d')   # unix-время последнего ответа
+        self.active = bytearray()       # 0 - пользователь удалил слово: в выученные оно не входит
+        self.dirty = set()              # индексы, измененные после последней контрольной точки
+        # Итоги по всем словам
+        self.answers = 0
+        self.correct_answers = 0
+        self.mastered = 0               # активных слов с серией не короче mastered_streak
+        self.best = 0
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def _slot(self, word_id):
+        slot = self.slots.get(word_id)
+        if slot is None:
+            slot = self.slots[word_id] = len(self.word_ids)
+            self.word_ids.append(word_id)
+            self.correct.append(0)
+            self.wrong.append(0)
+            self.streak.append(0)
+            self.best_streak.append(0)
+            self.answered_at.append(0.0)
+            self.active.append(1)
+        return slot
+
+    def load(self, word_id, correct, wrong, streak, best_streak, answered_at, active=True):
+        """Восстанавливает счетчики слова из строки word_progress"""
+        slot = self._slot(word_id)
+        self.active[slot] = active
+        streak = min(streak, MAX_STREAK)
+        best_streak = min(max(best_streak, streak), MAX_STREAK)
+        self.correct[slot] = correct
+        self.wrong[slot] = wrong
+        self.streak[slot] = streak
+        self.best_streak[slot] = best_streak
+        self.answered_at[slot] = answered_at
+        self.answers += correct + wrong
+        self.correct_answers += correct
+        self.mastered += active and streak >= self.mastered_streak
+        self.best = max(self.best, best_streak)
+
+    def record(self, word_id, correct, now):
+        """Учитывает ответ по слову, возвращает индекс слова в массивах"""
+        slot = self._slot(word_id)
+        self.set_active(word_id, True)
+        was_mastered = self.streak[slot] >= self.mastered_streak
+        if correct:
+            streak = min(self.streak[slot] + 1, MAX_STREAK)
+            self.correct[slot] += 1
+            self.correct_answers += 1
+            if streak > self.best_streak[slot]:
+                self.best_streak[slot] = streak
+                self.best = max(self.best, streak)
+        else:
+            streak = 0
+            self.wrong[slot] += 1
+        self.streak[slot] = streak
+        self.answered_at[slot] = now
+        self.answers += 1
+        self.mastered += (streak >= self.mastered_streak) - was_mastered
+        self.dirty.add(slot)
+        return slot
+
+    def set_active(self, word_id, active):
+        """Слово удалено из набора пользователя или снова добавлено: пересчитывает число выученных"""
+        slot = self.slots.get(word_id)
+        if slot is None or self.active[slot] == active:
+            return
+        self.active[slot] = active
+        if self.streak[slot] >= self.mastered_streak:
+            self.mastered += 1 if active else -1
+
+    def row(self, slot):
+        """(word_id, correct, wrong, streak, best_streak, answered_at) - как принимает load()"""
+        return (self.word_ids[slot], self.correct[slot], self.wrong[slot],
+                self.streak[slot], self.best_streak[slot], self.answered_at[slot])
+
+    def summary(self):
+        return {
+            'answers': self.answers,
+            'correct': self.correct_answers,
+            'accuracy': self.correct_answers / self.answers if self.answers else 0.0,
+            'mastered': self.mastered,
+            'words': len(self.word_ids),
+            'best_streak': self.best,
+        }
+
+
+class ProgressStore:
+    """Прогресс пользователей по users.id с пакетными контрольными точками в БД
+
+    loader(user_id) возвращает строки для UserProgress.load, saver(rows)
+    записывает строки (user_id, word_id, correct, wrong, streak, best_streak,
+    answered_at). Пользователи вытесняются по LRU сверх maxsize, но только
+    без несохраненных изменений.
+    """
+
+    def __init__(self, loader, saver, maxsize=10000, mastered_streak=3, difficulty_weight=1.0, batch_size=500):
+        self.loader = loader
+        self.saver = saver
+        self.maxsize = maxsize
+        self.mastered_streak = mastered_streak
+        self.difficulty_weight = difficulty_weight
+        self.batch_size = batch_size
+
+        self._users = OrderedDict()  # user_id -> UserProgress, в порядке использования
+        self._dirty_users = set()
+        self._lock = threading.Lock()
+        self._load_locks = LoadLocks()
+        self._checkpoint_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Счетчики
+        self.checkpoints = 0
+        self.rows_written = 0
+        self.failures = 0
+
+    def _lookup(self, user_id):
+        with self._lock:
+            progress = self._users.get(user_id)
+            if progress is not None:
+                self._users.move_to_end(user_id)
+            return progress
+
+    def _get(self, user_id):
+        """Прогресс пользователя; при промахе - одним запросом loader"""
+        progress = self._lookup(user_id)
+        if progress is not None:
+            return progress
+
+        def load():
+            progress = UserProgress(self.mastered_streak)
+            for row in self.loader(user_id):
+                progress.load(*row)
+            with self._lock:
+                self._users[user_id] = progress
+                self._evict()
+            return progress
+
+        return self._load_locks.load(user_id, lambda: self._lookup(user_id), load)
+
+    def _evict(self):
+        excess = len(self._users) - self.maxsize
+        if excess <= 0:
+            return
+        for user_id in [user_id for user_id in self._users if user_id not in self._dirty_users][:excess]:
+            del self._users[user_id]
+
+    def record(self, user_id, word_id, correct, now=None):
+        """Учитывает ответ за O(1), возвращает множитель интервала для слова (interval_factor)"""
+        now = time.time() if now is None else now
+        progress = self._get(user_id)
+        with self._lock:
+            slot = progress.record(word_id, correct, now)
+            self._dirty_users.add(user_id)
+            return interval_factor(progress.correct[slot], progress.wrong[slot], self.difficulty_weight)
+
+    def summary(self, user_id):
+        """Точность, выученные слова и лучшая серия пользователя из итогов в памяти"""
+        progress = self._get(user_id)
+        with self._lock:
+            return progress.summary()
+
+    def set_active(self, user_id, word_id, active):
+        """Слово удалено из набора пользователя или снова добавлено (прогресс не загружается, если его нет в памяти)"""
+        with self._lock:
+            progress = self._users.get(user_id)
+            if progress is not None:
+                progress.set_active(word_id, active)
+
+    def invalidate(self, user_id):
+        """Забывает прогресс пользователя (следующее обращение перечитает его из БД)"""
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._dirty_users.discard(user_id)
+
+    def checkpoint(self):
+        """Записывает измененные строки пачками по batch_size, возвращает число записанных строк"""
+        with self._checkpoint_lock:
+            with self._lock:
+                rows = []
+                for user_id in self._dirty_users:
+                    progress = self._users[user_id]
+                    rows.extend((user_id,) + progress.row(slot) for slot in progress.dirty)
+                    progress.dirty = set()
+                self._dirty_users = set()
+
+            written = 0
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    self.saver(batch)
+                    written += len(batch)
+            except Exception:
+                # Незаписанные строки снова помечаются измененными: их возьмет следующая контрольная точка
+                with self._lock:
+                    for row in rows[written:]:
+                        progress = self._users.get(row[0])
+                        if progress is not None:
+                            progress.dirty.add(progress.slots[row[1]])
+                            self._dirty_users.add(row[0])
+                self.failures += 1
+                raise
+            finally:
+                self.rows_written += written
+
+            if rows:
+                self.checkpoints += 1
+            return written
+
+    def start_background(self, interval=30):
+        """Периодически выполняет checkpoint в фоновом потоке"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    print(f"Progress checkpoint error: {e}")
+
+        self._thread = threading.Thread(target=run, name='ProgressCheckpoint', daemon=True)
+        self._thread.start()
+
+    def stop_background(self):
+        """Останавливает фоновый поток и записывает оставшиеся изменения"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.checkpoint()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'dirty_users': len(self._dirty_users),
+                'checkpoints': self.checkpoints,
+                'rows_written': self.rows_written,
+                'failures': self.failures,
+            }
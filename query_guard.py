@@ -0,0 +1,258 @@
+"""Учет SQL-запросов по хендлерам: бюджеты и поиск N+1
+
+Слушатели before/after_cursor_execute относят каждый запрос к текущему
+хендлеру (контекст metrics.timed_handler, то есть ко всему обновлению
+вместе с вложенными вызовами вроде show_next_card) и копят по отпечатку
+запроса число выполнений и время. Внутри одного обновления отмечаются:
+
+- дубли: тот же запрос с теми же параметрами повторно;
+- N+1: один и тот же запрос с разными параметрами больше repeat_threshold раз.
+
+Если хендлер превышает бюджет запросов, в режиме strict очередной запрос
+прерывается исключением QueryBudgetExceeded (падает тест или прогон), в
+режиме warn нарушение только печатается и считается. При debug=True
+нарушение сопровождается списком запросов обновления, а report() выдает
+самые затратные отпечатки.
+"""
+import hashlib
+import re
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+
+import metrics
+
+MODE_OFF = 'off'
+MODE_WARN = 'warn'
+MODE_STRICT = 'strict'
+
+BACKGROUND = '<background>'  # запросы вне хендлеров: запись лога, агрегаты, обслуживание
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+# IN (?, ?, ?) и VALUES (...), (...) разной длины - один отпечаток
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\([^)]+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)')
+_VALUES_LIST = re.compile(r'(VALUES\s*\(\?\))(?:\s*,\s*\(\?\))+', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement):
+    """Текст запроса без литералов и с одинаковыми списками параметров любой длины"""
+    text = _WHITESPACE.sub(' ', statement).strip()
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('(?)', text)
+    return _VALUES_LIST.sub(r'\1', text)
+
+
+def fingerprint_id(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]
+
+
+class StatementStats:
+    __slots__ = ('text', 'count', 'total_ns', 'handlers', 'duplicates', 'n_plus_one')
+
+    def __init__(self, text):
+        self.text = text
+        self.count = 0
+        self.total_ns = 0
+        self.handlers = {}   # хендлер -> число выполнений
+        self.duplicates = 0  # повторов с теми же параметрами внутри обновления
+        self.n_plus_one = 0  # обновлений, где запрос выполнился больше repeat_threshold раз
+
+
+class _UpdateQueries:
+    """Запросы одного вызова хендлера"""
+    __slots__ = ('handler', 'statements', 'seen', 'per_fingerprint', 'flagged', 'over_budget')
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.statements = []       # отпечатки по порядку - для бюджета и отладочного вывода
+        self.seen = set()          # (отпечаток, параметры)
+        self.per_fingerprint = {}  # отпечаток -> число выполнений
+        self.flagged = set()
+        self.over_budget = False
+
+
+class QueryGuard:
+    def __init__(self, mode=MODE_WARN, default_budget=None, budgets=None, repeat_threshold=3, debug=False):
+        if mode not in (MODE_OFF, MODE_WARN, MODE_STRICT):
+            raise ValueError(f"Unknown query guard mode: {mode}")
+        self.mode = mode
+        self.default_budget = default_budget
+        self.budgets = dict(budgets or {})
+        self.repeat_threshold = repeat_threshold
+        self.debug = debug
+
+        self._lock = threading.Lock()
+        self._updates = {}     # id(HandlerContext) -> _UpdateQueries
+        self._statements = {}  # отпечаток -> StatementStats
+        self._handlers = {}    # хендлер -> [обновлений, запросов, максимум за обновление]
+        self.violations = 0
+        self.duplicate_statements = 0
+        self.n_plus_one_patterns = 0
+
+    def budget_for(self, handler):
+        return self.budgets.get(handler, self.default_budget)
+
+    def install(self, engine):
+        if self.mode == MODE_OFF:
+            return
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self._before(conn, statement, parameters)
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self._after(conn)
+
+    def _update_for(self, handler_context):
+        key = id(handler_context)
+        update = self._updates.get(key)
+        if update is None:
+            update = self._updates[key] = _UpdateQueries(handler_context.name)
+            # Итоги по хендлеру - когда он завершится
+            handler_context.on_finish.append(lambda response_time: self._finish(key))
+        return update
+
+    def _before(self, conn, statement, parameters):
+        text = fingerprint(statement)
+        handler_context = metrics.current_context()
+        if handler_context is not None:
+            self._check(handler_context, text, parameters)
+        # После проверки: прерванный исключением запрос не оставляет незакрытый замер
+        conn.info.setdefault('guard_started', []).append((text, time.perf_counter_ns()))
+
+    def _check(self, handler_context, text, parameters):
+        """Учитывает запрос в обновлении: дубли, N+1 и бюджет хендлера"""
+        update = self._update_for(handler_context)
+        count = update.per_fingerprint.get(text, 0) + 1
+        update.per_fingerprint[text] = count
+        update.statements.append(text)
+
+        try:
+            params_key = (text, repr(parameters))
+        except Exception:
+            params_key = None
+        if params_key is not None:
+            if params_key in update.seen:
+                self._flag(update, text, 'duplicates', "repeated identical statement")
+            update.seen.add(params_key)
+        if count == self.repeat_threshold + 1:
+            self._flag(update, text, 'n_plus_one', f"statement executed {count}+ times (N+1)")
+
+        budget = self.budget_for(update.handler)
+        if budget is not None and len(update.statements) > budget and not update.over_budget:
+            update.over_budget = True
+            with self._lock:
+                self.violations += 1
+            message = (f"Query budget exceeded in {update.handler}: "
+                       f"{len(update.statements)} statements, budget {budget}")
+            if self.debug:
+                message += "\n" + self._dump_update(update)
+            if self.mode == MODE_STRICT:
+                raise QueryBudgetExceeded(message)
+            print(f"⚠ {message}")
+
+    def _after(self, conn):
+        text, started = conn.info['guard_started'].pop()
+        elapsed = time.perf_counter_ns() - started
+        handler_context = metrics.current_context()
+        handler = handler_context.name if handler_context is not None else BACKGROUND
+        with self._lock:
+            stats = self._statements.get(text)
+            if stats is None:
+                stats = self._statements[text] = StatementStats(text)
+            stats.count += 1
+            stats.total_ns += elapsed
+            stats.handlers[handler] = stats.handlers.get(handler, 0) + 1
+
+    def _flag(self, update, text, kind, reason):
+        with self._lock:
+            stats = self._statements.get(text)
+            if stats is None:
+                stats = self._statements[text] = StatementStats(text)
+            setattr(stats, kind, getattr(stats, kind) + 1)
+            if kind == 'duplicates':
+                self.duplicate_statements += 1
+            else:
+                self.n_plus_one_patterns += 1
+        if self.debug and (text, kind) not in update.flagged:
+            update.flagged.add((text, kind))
+            print(f"⚠ {update.handler}: {reason} [{fingerprint_id(text)}] {text[:200]}")
+
+    def _finish(self, key):
+        update = self._updates.pop(key, None)
+        if update is None:
+            return
+        with self._lock:
+            totals = self._handlers.setdefault(update.handler, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += len(update.statements)
+            totals[2] = max(totals[2], len(update.statements))
+
+    @staticmethod
+    def _dump_update(update):
+        lines = []
+        for index, text in enumerate(update.statements, 1):
+            lines.append(f"  {index:>3}. [{fingerprint_id(text)}] {text[:160]}")
+        return "\n".join(lines)
+
+    def handler_stats(self):
+        """{хендлер: {'updates', 'queries_per_update', 'max_queries', 'budget'}}"""
+        with self._lock:
+            items = sorted(self._handlers.items())
+        return {
+            handler: {
+                'updates': updates,
+                'queries_per_update': queries / updates,
+                'max_queries': max_queries,
+                'budget': self.budget_for(handler),
+            }
+            for handler, (updates, queries, max_queries) in items
+        }
+
+    def report(self, top=10, key='count'):
+        """Самые затратные отпечатки: по числу выполнений (count), времени (time) или повторам (repeats)"""
+        with self._lock:
+            statements = list(self._statements.values())
+        order = {
+            'count': lambda stats: stats.count,
+            'time': lambda stats: stats.total_ns,
+            'repeats': lambda stats: stats.duplicates + stats.n_plus_one,
+        }[key]
+        return [
+            {
+                'id': fingerprint_id(stats.text),
+                'statement': stats.text,
+                'count': stats.count,
+                'total_ms': stats.total_ns / 1e6,
+                'handlers': dict(stats.handlers),
+                'duplicates': stats.duplicates,
+                'n_plus_one': stats.n_plus_one,
+            }
+            for stats in sorted(statements, key=order, reverse=True)[:top]
+        ]
+
+    def format_report(self, top=10, key='count'):
+        lines = [f"Query guard: {self.violations} budget violations, "
+                 f"{self.duplicate_statements} duplicate statements, {self.n_plus_one_patterns} N+1 patterns"]
+        for handler, stats in self.handler_stats().items():
+            budget = stats['budget'] if stats['budget'] is not None else '-'
+            lines.append(f"  {handler}: {stats['queries_per_update']:.1f} per update, "
+                         f"max {stats['max_queries']}, budget {budget}")
+        lines.append(f"Top statements by {key}:")
+        for item in self.report(top, key):
+            handlers = ', '.join(f"{name}={count}" for name, count in item['handlers'].items())
+            lines.append(f"  [{item['id']}] x{item['count']} {item['total_ms']:.1f} ms "
+                         f"dup={item['duplicates']} n+1={item['n_plus_one']} ({handlers})")
+            lines.append(f"      {item['statement'][:200]}")
+        return "\n".join(lines)
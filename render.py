@@ -0,0 +1,74 @@
+"""Тексты и клавиатуры викторины, заранее сериализованные в JSON
+
+Клавиатура уходит в Bot API строкой JSON, поэтому объекты
+ReplyKeyboardMarkup/KeyboardButton на каждую карточку не нужны: постоянные
+фрагменты (служебные кнопки, клавиатуры без слов) сериализуются один раз при
+импорте, а в карточке склеиваются с кнопками вариантов. Раскладка и JSON
+совпадают с тем, что давал ReplyKeyboardMarkup.to_json().
+"""
+from json.encoder import encode_basestring_ascii as _quote
+
+WRONG_MARK = ' ❌'
+
+
+class Command:
+    ADD_WORD = 'Добавить слово ➕'
+    DELETE_WORD = 'Удалить слово🔙'
+    NEXT = 'Дальше ⏭'
+
+
+WELCOME_TEXT = """Привет 👋 Давай попрактикуемся в английском языке. Тренировки можешь проходить в удобном для себя темпе.
+
+У тебя есть возможность использовать тренажёр, как конструктор, и собирать свою собственную базу для обучения. Для этого воспользуйся инструментами:
+
+• добавить слово ➕
+• удалить слово 🔙
+
+Ну что, начнём ⬇️"""
+
+NO_WORDS_TEXT = "Пока нет слов для изучения. Добавьте слова с помощью кнопки ниже:"
+
+
+def button(text):
+    """JSON кнопки - как json.dumps({'text': text}), но без промежуточного словаря"""
+    return '{"text": ' + _quote(text) + '}'
+
+
+def keyboard(rows):
+    """Клавиатура из уже сериализованных рядов '[кнопка, ...]'"""
+    return '{"keyboard": [' + ', '.join(rows) + '], "resize_keyboard": true}'
+
+
+# Служебные кнопки под вариантами: по две в ряд (row_width=2)
+_SERVICE_ROWS = (
+    '[' + button(Command.NEXT) + ', ' + button(Command.ADD_WORD) + ']',
+    '[' + button(Command.DELETE_WORD) + ']',
+)
+_SERVICE_TAIL = ', '.join(_SERVICE_ROWS) + '], "resize_keyboard": true}'
+
+# После правильного ответа - только служебные кнопки одним рядом
+SERVICE_KEYBOARD = keyboard(['[' + ', '.join(map(button, (Command.NEXT, Command.ADD_WORD, Command.DELETE_WORD))) + ']'])
+NO_WORDS_KEYBOARD = keyboard(['[' + button(Command.ADD_WORD) + ']'])
+
+
+def card_keyboard(options, wrong=None):
+    """Варианты ответа по одному в ряд и служебные кнопки; вариант wrong помечается ❌"""
+    parts = ['{"keyboard": [']
+    for option in options:
+        parts.append('[{"text": ')
+        parts.append(_quote(option + WRONG_MARK if option == wrong else option))
+        parts.append('}], ')
+    parts.append(_SERVICE_TAIL)
+    return ''.join(parts)
+
+
+def question_text(russian_translation):
+    return "Выбери перевод слова:\n🇷🇺 " + russian_translation
+
+
+def correct_text(target_word, translate_word):
+    return "✅ Отлично! Правильно!\n" + target_word + " -> " + translate_word
+
+
+def wrong_text(translate_word):
+    return "❌ Неправильно! Попробуйте ещё раз вспомнить слово:\n🇷🇺 " + translate_word
@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+# Политики поведения при переполненной очереди
+OVERFLOW_DROP_NEW = 'drop_new'        # отбрасываем новое событие
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # вытесняем самое старое событие
+OVERFLOW_BLOCK = 'block'              # ждем место в очереди, затем отбрасываем
+
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK)
+
+_STOP = object()
+
+
+class RequestLogWriter:
+    """Фоновая запись логов пользователей пачками (write-behind)
+
+    Хендлеры только кладут событие в ограниченную очередь, а отдельный поток
+    пишет накопленные события одним multi-row INSERT, когда набралось
+    batch_size событий или прошло flush_interval секунд.
+    """
+
+    def __init__(self, db, max_queue_size=10000, batch_size=200, flush_interval=1.0,
+                 overflow_policy=OVERFLOW_DROP_OLDEST, block_timeout=0.05):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Счетчики
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def start(self):
+        """Запускает фоновый поток записи"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='RequestLogWriter', daemon=True)
+        self._thread.start()
+
+    def log(self, telegram_id, provider, query, response_time=0, success=True, error_message=None):
+        """Ставит событие в очередь, не обращаясь к БД. Возвращает False если событие отброшено"""
+        event = {
+            'telegram_id': telegram_id,
+            'provider': provider,
+            'query': query,
+            'response_time': response_time,
+            'success': success,
+            'error_message': error_message,
+            'created_at': datetime.now(),
+        }
+
+        if self._put(event):
+            with self._lock:
+                self.enqueued += 1
+            return True
+
+        with self._lock:
+            self.dropped += 1
+        return False
+
+    def _put(self, event):
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            try:
+                self._queue.put(event, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                return False
+
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            if self.overflow_policy == OVERFLOW_DROP_NEW:
+                return False
+
+        # OVERFLOW_DROP_OLDEST: освобождаем место за счет самого старого события
+        try:
+            self._queue.get_nowait()
+            with self._lock:
+                self.dropped += 1
+        except queue.Empty:
+            pass
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect_batch()
+            if batch:
+                self._write(batch)
+
+    def _collect_batch(self):
+        """Собирает пачку событий по размеру или по времени"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=max(timeout, 0)) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _write(self, batch):
+        try:
+            written = self.db.log_user_requests_bulk(batch)
+            with self._lock:
+                self.written += written
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+                self.dropped += len(batch)
+            print(f"Logging error: {e}")
+
+    def stop(self, timeout=10.0):
+        """Останавливает поток, дописывая все накопленные события"""
+        if not self._thread or not self._thread.is_alive():
+            # Поток не запускался - пишем остаток синхронно
+            self._drain_sync()
+            return
+
+        # Сигнал остановки ставим в очередь, чтобы он шел после всех событий
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._drain_sync()
+
+    def _drain_sync(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stats(self):
+        """Возвращает счетчики очереди"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed_batches': self.failed_batches,
+            }
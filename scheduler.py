@@ -0,0 +1,67 @@
+import heapq
+import time
+
+# Параметры SM-2
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_INTERVAL = 60          # секунды до повтора после ошибки
+FIRST_INTERVALS = (600, 86400)  # 10 минут, затем сутки
+SHOWN_DEFER = 30               # на сколько отодвигать показанную, но не отвеченную карточку
+
+
+def review(ease, interval, repetitions, correct, now=None, factor=1.0):
+    """Пересчитывает расписание карточки по SM-2
+
+    Возвращает (ease, interval, repetitions, due_ts), где interval в секундах,
+    а due_ts - unix-время следующего показа. factor < 1 приближает показ
+    трудного слова (см. progress.interval_factor), не меняя сам интервал SM-2.
+    """
+    now = time.time() if now is None else now
+
+    if not correct:
+        ease = max(MIN_EASE, ease - 0.2)
+        return ease, RELEARN_INTERVAL, 0, now + RELEARN_INTERVAL * factor
+
+    if repetitions < len(FIRST_INTERVALS):
+        interval = FIRST_INTERVALS[repetitions]
+    else:
+        interval = int(interval * ease)
+    ease = ease + 0.1
+    return ease, interval, repetitions + 1, now + interval * factor
+
+
+class DueQueue:
+    """Очередь карточек по времени показа (min-heap с ленивым удалением)"""
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}  # word_id -> актуальное due_ts
+
+    def __len__(self):
+        return len(self._due)
+
+    def push(self, word_id, due_ts):
+        self._due[word_id] = due_ts
+        heapq.heappush(self._heap, (due_ts, word_id))
+
+        # Перестраиваем кучу, когда устаревших записей становится слишком много
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, wid) for wid, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, word_id):
+        # Запись в куче остается и будет пропущена при извлечении
+        self._due.pop(word_id, None)
+
+    def peek(self):
+        """Возвращает (due_ts, word_id) ближайшей карточки или None"""
+        heap = self._heap
+        while heap:
+            due_ts, word_id = heap[0]
+            if self._due.get(word_id) == due_ts:
+                return due_ts, word_id
+            heapq.heappop(heap)
+        return None
+
+    def due_ts(self, word_id):
+        return self._due.get(word_id)
@@ -0,0 +1,275 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+from telebot.apihelper import ApiTelegramException
+
+from metrics import LatencyHistogram
+
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = '\n\n'
+
+
+class TokenBucket:
+    """Ведро токенов: rate сообщений в секунду, до burst подряд"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def is_full(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def take(self, now):
+        """Забирает токен; возвращает 0 или сколько секунд ждать до появления токена"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Outgoing:
+    __slots__ = ('chat_id', 'text', 'kwargs', 'method', 'enqueued_at', 'attempts')
+
+    def __init__(self, chat_id, text, kwargs, method='send_message'):
+        self.chat_id = chat_id
+        self.text = text  # для send_document - содержимое файла
+        self.kwargs = kwargs
+        self.method = method
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+    def can_merge(self, text, kwargs):
+        # Клавиатура есть только у последнего сообщения склейки; остальные параметры должны совпадать
+        return (self.method == 'send_message'
+                and 'reply_markup' not in self.kwargs
+                and {k: v for k, v in kwargs.items() if k != 'reply_markup'} == self.kwargs
+                and len(self.text) + len(MERGE_SEPARATOR) + len(text) <= MAX_MESSAGE_LENGTH)
+
+
+class SendQueue:
+    """Очередь исходящих сообщений с учетом лимитов Telegram
+
+    Хендлеры вызывают send_message как у TeleBot, но сообщение только ставится
+    в очередь своего чата. Воркеры отправляют их по порядку внутри чата, не
+    чаще chat_rate в секунду на чат и global_rate в секунду всего. На ответ 429
+    чат откладывается на retry_after секунд, сообщение отправляется повторно.
+    Подряд идущие тексты одному чату, которые еще не ушли, склеиваются в одно
+    сообщение (merge=True).
+    """
+
+    def __init__(self, bot, workers=4, global_rate=30, chat_rate=1, chat_burst=3, merge=True,
+                 max_retries=5, max_pending=10000):
+        self.bot = bot
+        self.workers = workers
+        self.merge = merge
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._chat_buckets = {}
+        self._pruned_at = time.monotonic()
+        self._pending = {}      # chat_id -> deque[_Outgoing]
+        self._ready = deque()   # чаты с сообщениями, которые можно отправлять
+        self._delayed = []      # куча (когда можно, chat_id) для чатов, упершихся в лимит
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+        # Метрики
+        self.depth = 0
+        self.max_depth = 0
+        self.queued = 0
+        self.sent = 0
+        self.merged = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+        self._latency = LatencyHistogram()  # мкс от постановки в очередь до отправки
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'Sender-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Ставит сообщение в очередь чата; блокируется, если в очереди max_pending сообщений"""
+        self._enqueue(chat_id, text, kwargs, 'send_message')
+
+    def send_document(self, chat_id, document, **kwargs):
+        """Ставит файл (bytes, чтобы его можно было отправить повторно) в ту же очередь чата"""
+        self._enqueue(chat_id, document, kwargs, 'send_document')
+
+    def _enqueue(self, chat_id, text, kwargs, method):
+        with self._cond:
+            while self.depth >= self.max_pending and not self._stopping:
+                self._cond.wait()
+
+            pending = self._pending.get(chat_id)
+            if method == 'send_message' and self.merge and pending and pending[-1].can_merge(text, kwargs):
+                last = pending[-1]
+                last.text += MERGE_SEPARATOR + text
+                last.kwargs = kwargs
+                self.merged += 1
+                return
+
+            if pending is None:
+                pending = self._pending[chat_id] = deque()
+            pending.append(_Outgoing(chat_id, text, kwargs, method))
+            self.queued += 1
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            if len(pending) == 1 and chat_id not in self._in_flight:
+                self._ready.append(chat_id)
+                self._cond.notify()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _delay(self, chat_id, wait):
+        heapq.heappush(self._delayed, (time.monotonic() + wait, chat_id))
+        self._cond.notify()
+
+    def _next_message(self):
+        """Ждет чат, которому можно отправить сообщение; None при остановке с пустой очередью"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[1])
+
+                while self._ready:
+                    chat_id = self._ready.popleft()
+                    wait = self._chat_bucket(chat_id).take(now)
+                    if wait:
+                        self.throttled += 1
+                        self._delay(chat_id, wait)
+                        continue
+                    self._in_flight.add(chat_id)
+                    return self._pending[chat_id].popleft()
+
+                if self._stopping and not self.depth:
+                    return None
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._cond.wait(timeout)
+
+    def _finish(self, message, retry_after=None):
+        """Возвращает чат в очередь после отправки (или повторной постановки) сообщения"""
+        with self._cond:
+            chat_id = message.chat_id
+            pending = self._pending[chat_id]
+            if retry_after is not None:
+                pending.appendleft(message)
+            else:
+                self.depth -= 1
+                self._cond.notify_all()
+
+            self._in_flight.discard(chat_id)
+            if not pending:
+                del self._pending[chat_id]
+                self._prune_buckets()
+            elif retry_after:
+                self._delay(chat_id, retry_after)
+            else:
+                self._ready.append(chat_id)
+                self._cond.notify()
+
+    def _prune_buckets(self, interval=60.0):
+        """Раз в interval секунд удаляет полные ведра чатов без сообщений - новое создастся таким же"""
+        now = time.monotonic()
+        if now - self._pruned_at < interval:
+            return
+        self._pruned_at = now
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items()
+                        if chat_id not in self._pending and bucket.is_full(now)]:
+            del self._chat_buckets[chat_id]
+
+    def _run(self):
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+
+            # Общий лимит бота: ждем токен вне блокировки
+            while True:
+                with self._cond:
+                    wait = self._global.take(time.monotonic())
+                    if wait:
+                        self.throttled += 1
+                if not wait:
+                    break
+                time.sleep(wait)
+
+            message.attempts += 1
+            try:
+                getattr(self.bot, message.method)(message.chat_id, message.text, **message.kwargs)
+            except ApiTelegramException as e:
+                if e.error_code == 429 and message.attempts <= self.max_retries:
+                    retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                    with self._cond:
+                        self.retried += 1
+                    self._finish(message, retry_after=retry_after)
+                    continue
+                self._fail(message, e)
+                continue
+            except Exception as e:
+                if message.attempts <= self.max_retries:
+                    # Сетевая ошибка: повтор с экспоненциальной задержкой
+                    with self._cond:
+                        self.retried += 1
+                    self._finish(message, retry_after=min(2 ** message.attempts * 0.5, 30))
+                    continue
+                self._fail(message, e)
+                continue
+
+            with self._cond:
+                self.sent += 1
+                self._latency.record((time.monotonic() - message.enqueued_at) * 1_000_000)
+            self._finish(message)
+
+    def _fail(self, message, error):
+        with self._cond:
+            self.failed += 1
+        print(f"Send to chat {message.chat_id} failed: {error}")
+        self._finish(message)
+
+    def stop(self, timeout=10.0):
+        """Отправляет все, что уже в очереди, и останавливает воркеры"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        with self._cond:
+            result = {
+                'queue_depth': self.depth,
+                'max_depth': self.max_depth,
+                'chats_waiting': len(self._delayed),
+                'queued': self.queued,
+                'merged': self.merged,
+                'sent': self.sent,
+                'throttled': self.throttled,
+                'retried': self.retried,
+                'failed': self.failed,
+            }
+            result.update(self._latency.percentiles_ms())
+        return result
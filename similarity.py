@@ -0,0 +1,226 @@
+import heapq
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+MAGIC = b'SIMIDX1\0'
+HEADER = struct.Struct('<8s5q')  # magic, k, rows, buckets, postings, blob
+ITEM_SIZE = array('q').itemsize
+
+DEFAULT_NEIGHBORS = 8
+DEFAULT_BUCKETS = 1 << 16
+MAX_BUCKET_SCAN = 5000  # очень частые n-граммы почти ничего не говорят о похожести
+ADD_BUCKET_SCAN = 1000  # то же при добавлении слова на лету, в потоке хендлера
+ADD_MAX_CANDIDATES = 100  # при добавлении оцениваются только кандидаты с наибольшим числом общих n-грамм
+LENGTH_PENALTY = 0.05   # штраф за каждый символ разницы в длине
+
+
+@lru_cache(maxsize=65536)
+def ngrams(word, n=3):
+    """Символьные n-граммы слова с маркерами начала и конца (кэшируются: соседи пересчитываются часто)"""
+    word = f"^{word.lower()}$"
+    if len(word) <= n:
+        return frozenset((word,))
+    return frozenset(word[index:index + n] for index in range(len(word) - n + 1))
+
+
+def bucket_of(gram, buckets):
+    return zlib.crc32(gram.encode('utf-8')) % buckets
+
+
+def score(shared, grams_a, grams_b, length_a, length_b):
+    """Похожесть пары слов: коэффициент Жаккара по n-граммам со штрафом за разницу длины"""
+    jaccard = shared / (grams_a + grams_b - shared)
+    return jaccard - LENGTH_PENALTY * abs(length_a - length_b)
+
+
+def _top_neighbors(word_id, word, grams, candidates, words, k):
+    """Лучшие k соседей из {id: число общих n-грамм} (без того же слова)"""
+    key = word.lower()
+    scored = []
+    for other_id, shared in candidates.items():
+        other = words.get(other_id)
+        if other_id == word_id or other is None or other.lower() == key:
+            continue
+        scored.append((score(shared, len(grams), len(ngrams(other)), len(word), len(other)), other_id))
+    return [other_id for _, other_id in heapq.nlargest(k, scored)]
+
+
+def build_index(rows, path, k=DEFAULT_NEIGHBORS, buckets=DEFAULT_BUCKETS):
+    """Строит индекс похожих слов по строкам (word_id, english_word) и атомарно пишет его в path
+
+    Кандидаты для каждого слова - слова с общими корзинами n-грамм, из них
+    остаются k лучших по score(). Возвращает число слов в индексе.
+    """
+    words = {}
+    postings = [[] for _ in range(buckets)]
+    for word_id, english_word in rows:
+        words[word_id] = english_word
+        for bucket in {bucket_of(gram, buckets) for gram in ngrams(english_word)}:
+            postings[bucket].append(word_id)
+
+    size = max(words, default=-1) + 1
+    neighbors = array('q', [-1]) * (size * k)
+    for word_id, english_word in words.items():
+        grams = ngrams(english_word)
+        candidates = Counter()
+        for bucket in {bucket_of(gram, buckets) for gram in grams}:
+            if len(postings[bucket]) <= MAX_BUCKET_SCAN:
+                candidates.update(postings[bucket])
+        for index, other_id in enumerate(_top_neighbors(word_id, english_word, grams, candidates, words, k)):
+            neighbors[word_id * k + index] = other_id
+
+    blob = bytearray()
+    text_offsets = array('q', [0]) * (size + 1)
+    for word_id in range(size):
+        blob += words.get(word_id, '').encode('utf-8')
+        text_offsets[word_id + 1] = len(blob)
+    # Выравниваем блоб, чтобы файл оставался кратным размеру элемента
+    blob += b'\0' * (-len(blob) % ITEM_SIZE)
+
+    bucket_offsets = array('q', [0]) * (buckets + 1)
+    flat = array('q')
+    for bucket, items in enumerate(postings):
+        flat.extend(items)
+        bucket_offsets[bucket + 1] = len(flat)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as stream:
+        stream.write(HEADER.pack(MAGIC, k, size, buckets, len(flat), len(blob)))
+        neighbors.tofile(stream)
+        text_offsets.tofile(stream)
+        bucket_offsets.tofile(stream)
+        flat.tofile(stream)
+        stream.write(blob)
+    os.replace(tmp_path, path)
+    return len(words)
+
+
+class SimilarityIndex:
+    """Индекс похожих слов для вариантов ответа
+
+    Таблица соседей хранится плотным массивом по words.id (k соседей на слово),
+    поэтому соседи слова находятся одним обращением по смещению. Файл
+    строится заранее (manage.py build-similarity) и отображается в память
+    через mmap, без чтения целиком. Слова, добавленные после сборки,
+    индексируются на лету в небольших словарях поверх файла.
+    """
+
+    def __init__(self, k=DEFAULT_NEIGHBORS, buckets=DEFAULT_BUCKETS):
+        self.k = k
+        self.buckets = buckets
+        self.rows = 0
+        self._mmap = None
+        self._neighbors = self._text_offsets = self._bucket_offsets = self._postings = self._blob = None
+
+        # Слова, добавленные после сборки файла
+        self._extra_words = {}      # word_id -> english_word
+        self._extra_neighbors = {}  # word_id -> [word_id]
+        self._extra_postings = {}   # корзина -> [word_id]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, k=DEFAULT_NEIGHBORS):
+        """Отображает файл индекса в память; если файла нет - пустой индекс"""
+        if not path or not os.path.exists(path):
+            return cls(k=k)
+
+        with open(path, 'rb') as stream:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, k, rows, buckets, postings, blob = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a similarity index")
+
+        index = cls(k=k, buckets=buckets)
+        index.rows = rows
+        index._mmap = mapped
+        view = memoryview(mapped)
+        offset = HEADER.size
+        for name, items in (('_neighbors', rows * k), ('_text_offsets', rows + 1),
+                            ('_bucket_offsets', buckets + 1), ('_postings', postings)):
+            setattr(index, name, view[offset:offset + items * ITEM_SIZE].cast('q'))
+            offset += items * ITEM_SIZE
+        index._blob = view[offset:offset + blob]
+        return index
+
+    def close(self):
+        for name in ('_neighbors', '_text_offsets', '_bucket_offsets', '_postings', '_blob'):
+            view = getattr(self, name)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __len__(self):
+        return self.rows + len(self._extra_words)
+
+    def word(self, word_id):
+        """Английское слово по words.id или None, если слова нет в индексе"""
+        word = self._extra_words.get(word_id)
+        if word is not None or self._blob is None or not 0 <= word_id < self.rows:
+            return word
+        start, end = self._text_offsets[word_id], self._text_offsets[word_id + 1]
+        return bytes(self._blob[start:end]).decode('utf-8') if end > start else None
+
+    def neighbors(self, word_id):
+        """words.id похожих слов, от самых похожих"""
+        extra = self._extra_neighbors.get(word_id)
+        if extra is not None:
+            return extra
+        if self._neighbors is None or not 0 <= word_id < self.rows:
+            return []
+        row = self._neighbors[word_id * self.k:(word_id + 1) * self.k]
+        return [other_id for other_id in row if other_id >= 0]
+
+    def _candidates(self, grams):
+        """Слова с общими корзинами; корзины больше ADD_BUCKET_SCAN (файл и добавленные слова вместе) пропускаются"""
+        candidates = Counter()
+        for bucket in {bucket_of(gram, self.buckets) for gram in grams}:
+            start = end = 0
+            if self._bucket_offsets is not None:
+                start, end = self._bucket_offsets[bucket], self._bucket_offsets[bucket + 1]
+            extra = self._extra_postings.get(bucket, ())
+            if end - start + len(extra) > ADD_BUCKET_SCAN:
+                continue
+            if end > start:
+                candidates.update(self._postings[start:end].tolist())
+            candidates.update(extra)
+        return candidates
+
+    def add(self, word_id, english_word):
+        """Добавляет новое слово: находит его соседей и предлагает его соседям в ответ"""
+        with self._lock:
+            if self.word(word_id) is not None:
+                return False
+
+            grams = ngrams(english_word)
+            candidates = dict(self._candidates(grams).most_common(ADD_MAX_CANDIDATES))
+            words = {other_id: self.word(other_id) for other_id in candidates}
+            words[word_id] = english_word
+            nearest = _top_neighbors(word_id, english_word, grams, candidates, words, self.k)
+
+            self._extra_words[word_id] = english_word
+            self._extra_neighbors[word_id] = nearest
+            for bucket in {bucket_of(gram, self.buckets) for gram in grams}:
+                self._extra_postings.setdefault(bucket, []).append(word_id)
+
+            # Похожесть симметрична: новое слово может вытеснить худшего соседа у найденных слов
+            for other_id in nearest:
+                other = words[other_id]
+                other_grams = ngrams(other)
+                current = self.neighbors(other_id)
+                shared = {candidate_id: len(other_grams & ngrams(self.word(candidate_id) or ''))
+                          for candidate_id in current + [word_id]}
+                self._extra_neighbors[other_id] = _top_neighbors(
+                    other_id, other, other_grams, shared,
+                    {candidate_id: self.word(candidate_id) for candidate_id in shared}, self.k
+                )
+            return True
@@ -0,0 +1,255 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from telebot.storage import StateMemoryStorage
+from telebot.storage.base_storage import StateStorageBase, StateDataContext
+
+
+class SQLStateBackend:
+    """Состояния в таблице bot_states через DatabaseManager"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def load(self, key):
+        row = self.db.load_bot_state(key)
+        if row is None:
+            return None
+        state, data_json, updated_at = row
+        return state, json.loads(data_json) if data_json else {}, updated_at.timestamp()
+
+    def store(self, key, state, data):
+        self.db.save_bot_state(key, state, json.dumps(data, ensure_ascii=False))
+
+    def delete(self, key):
+        self.db.delete_bot_state(key)
+
+    def delete_expired(self, idle_timeout, batch_size):
+        cutoff = datetime.now() - timedelta(seconds=idle_timeout)
+        return self.db.delete_expired_bot_states(cutoff, batch_size)
+
+
+class RedisStateBackend:
+    """Состояния в Redis (или совместимом клиенте с get/set/delete)
+
+    Просроченные ключи удаляет сам Redis по TTL, поэтому delete_expired ничего не делает.
+    """
+
+    def __init__(self, client, idle_timeout, prefix='telebot_state:'):
+        self.client = client
+        self.idle_timeout = idle_timeout
+        self.prefix = prefix
+
+    def load(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        return record['state'], record['data'], record['updated_at']
+
+    def store(self, key, state, data):
+        record = {'state': state, 'data': data, 'updated_at': time.time()}
+        self.client.set(self.prefix + key, json.dumps(record, ensure_ascii=False), ex=self.idle_timeout)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def delete_expired(self, idle_timeout, batch_size):
+        return 0
+
+
+class TieredStateStorage(StateStorageBase):
+    """Хранилище состояний telebot: горячий кэш в памяти + постоянный бэкенд
+
+    Все изменения сразу пишутся в бэкенд (write-through), а чтения обслуживает
+    кэш в памяти, поэтому bot.retrieve_data не ходит в БД. Записи, к которым не
+    обращались дольше idle_timeout секунд, считаются истекшими. Кэш доверяет
+    себе hot_ttl секунд, и это безопасно только для одного процесса: другой
+    процесс прочитал бы устаревшее состояние и затер бы им чужую запись.
+    При общем бэкенде (create_state_storage(shared=True)) hot_ttl=0 - каждое
+    чтение идет в бэкенд.
+    """
+
+    def __init__(self, backend, idle_timeout=3600, hot_ttl=60, separator=':', prefix='telebot'):
+        self.backend = backend
+        self.idle_timeout = idle_timeout
+        self.hot_ttl = hot_ttl
+        self.separator = separator
+        self.prefix = prefix
+
+        self._hot = {}  # key -> [state, data, touched_at (time.time()), loaded_at (monotonic)]
+        # Ключи, которых точно нет (удалены или не найдены), -> loaded_at: повторные
+        # get_state/retrieve_data после delete_state не идут в бэкенд
+        self._absent = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+
+    def _key(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return self._get_key(chat_id, user_id, self.prefix, self.separator,
+                             business_connection_id, message_thread_id, bot_id)
+
+    def _get_record(self, key):
+        """Возвращает [state, data, ...] из кэша или бэкенда, None если записи нет или она истекла"""
+        now = time.time()
+        with self._lock:
+            record = self._hot.get(key)
+            absent_at = self._absent.get(key) if record is None else None
+        if absent_at is not None and time.monotonic() - absent_at <= self.hot_ttl:
+            return None
+        if record is not None and time.monotonic() - record[3] > self.hot_ttl:
+            record = None
+
+        if record is None:
+            loaded = self.backend.load(key)
+            if loaded is None:
+                with self._lock:
+                    self._hot.pop(key, None)
+                    self._absent[key] = time.monotonic()
+                return None
+            state, data, updated_at = loaded
+            record = [state, data, updated_at, time.monotonic()]
+            with self._lock:
+                self._hot[key] = record
+
+        if now - record[2] > self.idle_timeout:
+            self._remove(key)
+            return None
+        return record
+
+    def _put(self, key, state, data):
+        record = [state, data, time.time(), time.monotonic()]
+        self.backend.store(key, state, data)
+        with self._lock:
+            self._hot[key] = record
+            self._absent.pop(key, None)
+
+    def _remove(self, key):
+        with self._lock:
+            self._hot.pop(key, None)
+            self._absent[key] = time.monotonic()
+        self.backend.delete(key)
+
+    def set_state(self, chat_id, user_id, state, business_connection_id=None, message_thread_id=None, bot_id=None):
+        if hasattr(state, 'name'):
+            state = state.name
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._get_record(key)
+        self._put(key, state, record[1] if record else {})
+        return True
+
+    def get_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        record = self._get_record(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record[0] if record else None
+
+    def delete_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        if self._get_record(key) is None:
+            return False
+        self._remove(key)
+        return True
+
+    def set_data(self, chat_id, user_id, key, value, business_connection_id=None, message_thread_id=None, bot_id=None):
+        _key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._get_record(_key)
+        if record is None:
+            raise RuntimeError(f"TieredStateStorage: key {_key} does not exist.")
+        data = dict(record[1])
+        data[key] = value
+        self._put(_key, record[0], data)
+        return True
+
+    def get_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        record = self._get_record(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record[1] if record else {}
+
+    def reset_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._get_record(key)
+        if record is None:
+            return False
+        self._put(key, record[0], {})
+        return True
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return StateDataContext(
+            self,
+            chat_id=chat_id,
+            user_id=user_id,
+            business_connection_id=business_connection_id,
+            message_thread_id=message_thread_id,
+            bot_id=bot_id,
+        )
+
+    def save(self, chat_id, user_id, data, business_connection_id=None, message_thread_id=None, bot_id=None):
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._get_record(key)
+        if record is None:
+            return False
+        # Неизмененные данные повторно не пишем
+        if data != record[1]:
+            self._put(key, record[0], data)
+        return True
+
+    def sweep(self, batch_size=500):
+        """Удаляет истекшие сессии из кэша и бэкенда пачками. Возвращает число удаленных из бэкенда"""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            expired = [key for key, record in self._hot.items() if record[2] < cutoff]
+            stale = time.monotonic() - self.hot_ttl
+            for key in [key for key, absent_at in self._absent.items() if absent_at < stale]:
+                del self._absent[key]
+        for start in range(0, len(expired), batch_size):
+            with self._lock:
+                for key in expired[start:start + batch_size]:
+                    self._hot.pop(key, None)
+        return self.backend.delete_expired(self.idle_timeout, batch_size)
+
+    def start_sweeper(self, interval=300, batch_size=500):
+        """Запускает периодическую очистку истекших сессий в фоне"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop_sweeper.clear()
+
+        def run():
+            while not self._stop_sweeper.wait(interval):
+                try:
+                    self.sweep(batch_size)
+                except Exception as e:
+                    print(f"State sweep error: {e}")
+
+        self._sweeper = threading.Thread(target=run, name='StateSweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_sweeper.set()
+
+    def __str__(self):
+        return f"<TieredStateStorage: {len(self._hot)} hot sessions, backend={type(self.backend).__name__}>"
+
+
+def create_state_storage(db, backend='sql', idle_timeout=3600, hot_ttl=60, redis_url=None, shared=False):
+    """Создает хранилище состояний по имени бэкенда: memory, sql или redis
+
+    shared=True - с бэкендом работают несколько процессов бота: горячий кэш
+    (и кэш отсутствующих ключей) выключается, чтобы не читать и не записывать
+    обратно чужое устаревшее состояние.
+    """
+    if shared:
+        if backend == 'memory':
+            raise ValueError("STATE_BACKEND=memory cannot be shared between processes")
+        hot_ttl = 0
+    if backend == 'memory':
+        return StateMemoryStorage()
+    if backend == 'sql':
+        return TieredStateStorage(SQLStateBackend(db), idle_timeout=idle_timeout, hot_ttl=hot_ttl)
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package: pip install redis")
+        client = redis.Redis.from_url(redis_url)
+        return TieredStateStorage(RedisStateBackend(client, idle_timeout), idle_timeout=idle_timeout, hot_ttl=hot_ttl)
+    raise ValueError(f"Unknown state backend: {backend}")
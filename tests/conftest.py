@@ -0,0 +1,11 @@
+"""Окружение тестов: задается до импорта config/database, которые читают его при загрузке"""
+import os
+
+from benchmarks.common import use_temp_database
+
+use_temp_database('tests')
+os.environ.setdefault('BOT_TOKEN', '123456:TEST')
+# Отправка синхронно из хендлера
+os.environ.setdefault('SEND_WORKERS', '0')
+# Хендлер сверх бюджета SQL-запросов роняет тест
+os.environ.setdefault('QUERY_GUARD', 'strict')
@@ -0,0 +1,22 @@
+"""Постраничная выгрузка не теряет строки, созданные в одну секунду"""
+from sqlalchemy import func, select
+
+import export
+import migrations
+from database import UserWord, db
+
+
+def test_vocabulary_export_keeps_rows_from_the_same_second():
+    migrations.upgrade(db)
+    db.get_or_create_user(7_000_001, 'export_user')
+    # Одна пачка импорта: created_at всех строк - одна и та же секунда (значение по умолчанию в БД)
+    result = db.import_custom_words(7_000_001, ((f'export{index}', f'выгрузка{index}') for index in range(250)))
+    assert result['added'] == 250
+
+    with db.engine.connect() as conn:
+        total = conn.execute(select(func.count()).select_from(UserWord)).scalar()
+    chunks = list(export.iter_chunks(db.engine, 'vocabulary', chunk_size=100))
+    ids = [row['id'] for chunk in chunks for row in chunk]
+
+    assert len(ids) == len(set(ids)) == total
+    assert all(len(chunk) <= 100 for chunk in chunks)
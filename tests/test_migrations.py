@@ -0,0 +1,63 @@
+"""Миграции доводят базу, созданную до их появления через create_all, до текущей схемы"""
+from sqlalchemy import inspect, text
+
+import migrations
+from benchmarks.common import temp_database_url
+from database import DatabaseManager
+
+# Схема до расписания SM-2: слова у каждого пользователя свои, в user_words только членство
+PRE_SCHEDULE_SCHEMA = (
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, telegram_id BIGINT NOT NULL UNIQUE, username VARCHAR(100),
+        first_name VARCHAR(100), last_name VARCHAR(100), subscription_type VARCHAR(50),
+        balance DECIMAL(10, 2), is_active BOOLEAN, created_at DATETIME, updated_at DATETIME
+    )""",
+    """CREATE TABLE words (
+        id INTEGER PRIMARY KEY, english_word VARCHAR(100) NOT NULL, russian_translation VARCHAR(100) NOT NULL,
+        is_common BOOLEAN, created_at DATETIME
+    )""",
+    """CREATE TABLE user_words (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        word_id INTEGER NOT NULL REFERENCES words (id), is_active BOOLEAN, created_at DATETIME,
+        CONSTRAINT uq_user_words_user_word UNIQUE (user_id, word_id)
+    )""",
+    "INSERT INTO users (id, telegram_id, username) VALUES (1, 1001, 'old_user')",
+    "INSERT INTO words (id, english_word, russian_translation, is_common) VALUES (1, 'lighthouse', 'маяк', 0)",
+    "INSERT INTO user_words (user_id, word_id, is_active) VALUES (1, 1, 1)",
+)
+
+
+def test_upgrade_adds_schedule_to_pre_sm2_database():
+    db = DatabaseManager(temp_database_url('test_migrations'))
+    with db.engine.begin() as conn:
+        for statement in PRE_SCHEDULE_SCHEMA:
+            conn.execute(text(statement))
+
+    migrations.upgrade(db)
+
+    with db.engine.connect() as conn:
+        columns = {column['name'] for column in inspect(conn).get_columns('user_words')}
+        indexes = {index['name'] for index in inspect(conn).get_indexes('user_words')}
+        ease, repetitions, due_at = conn.execute(
+            text("SELECT ease, repetitions, due_at FROM user_words WHERE user_id = 1 AND word_id = 1")
+        ).one()
+    assert {'ease', 'interval', 'repetitions', 'due_at'} <= columns
+    assert 'ix_user_words_user_due' in indexes
+    assert (ease, repetitions, due_at) == (2.5, 0, None)
+    assert migrations.current_version(db.engine) == migrations.LATEST_VERSION
+
+    # Слово пользователя из старой базы попадает в очередь повторений
+    words = set()
+    while True:
+        word = db.get_next_word(1001)
+        if word is None or word['english_word'] in words:
+            break
+        words.add(word['english_word'])
+    assert 'lighthouse' in words
+
+
+def test_schedule_migration_is_idempotent():
+    db = DatabaseManager(temp_database_url('test_migrations_fresh'))
+    migrations.upgrade(db)
+    # Повтор на базе, где колонки и индекс уже есть, ничего не меняет
+    migrations._user_words_schedule(db)
@@ -0,0 +1,38 @@
+"""Хендлеры укладываются в бюджеты SQL-запросов (QueryGuard в режиме strict)
+
+Синтетические сессии из benchmarks.loadgen прогоняются через настоящие
+хендлеры main.py, как в benchmarks.bench_replay. В режиме strict запрос
+сверх бюджета прерывается QueryBudgetExceeded; нарушение, которое хендлер
+перехватил сам, видно по счетчику violations.
+
+    python -m pytest tests
+"""
+import argparse
+import os
+
+from benchmarks import bench_replay
+from benchmarks.loadgen import SessionMix
+
+# Хендлеры, которые обязательно встречаются в прогоне: иначе тест ничего не проверяет
+COVERED = (
+    'start_handler', 'handle_answer', 'next_handler', 'add_word_handler', 'process_english_word',
+    'process_russian_word', 'delete_word_handler', 'process_delete_word', 'show_stats',
+    # Фоновая задача, которую хендлеры ставят в очередь чата диспетчера
+    'prefetch_next_card',
+)
+
+
+def test_handlers_stay_within_query_budgets():
+    args = argparse.Namespace(
+        url=os.environ['DATABASE_URL'], users=10, seed=1, api_latency_ms=0.0,
+        prefetch=True, tracemalloc=False, query_guard='strict', save_updates=None
+    )
+    result = bench_replay.run(args, SessionMix(answers=20, stats_every=5))
+
+    guard = result['query_guard']
+    assert guard['violations'] == 0
+    handlers = guard['handlers']
+    assert set(COVERED) <= set(handlers)
+    for handler, stats in handlers.items():
+        if stats['budget'] is not None:
+            assert stats['max_queries'] <= stats['budget'], handler
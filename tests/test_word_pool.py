@@ -0,0 +1,36 @@
+"""Очередь показа WordPool: карточка, подготовленная заранее, не отодвигает слово до показа"""
+from vocabulary import WordPool
+
+
+def make_pool():
+    pool = WordPool()
+    pool.add(1, 'cat', 'кошка', due_ts=10.0)
+    pool.add(2, 'dog', 'собака', due_ts=20.0)
+    return pool
+
+
+def test_prepared_card_does_not_defer_word():
+    pool = make_pool()
+    assert pool.next_due_word(now=100.0, defer=False)['word_id'] == 1
+    # Карточку выбросили, не показав: слово остается первым в очереди
+    assert pool.next_due_word(now=100.0, defer=False)['word_id'] == 1
+    pool.mark_shown(1, now=100.0)
+    assert pool.next_due_word(now=100.0)['word_id'] == 2
+
+
+def test_shown_card_is_deferred():
+    pool = make_pool()
+    assert pool.next_due_word(now=100.0)['word_id'] == 1
+    assert pool.next_due_word(now=100.0)['word_id'] == 2
+
+
+def test_wrong_options_skip_foreign_words_and_synonyms():
+    pool = WordPool()
+    pool.add(1, 'color', 'цвет')
+    pool.add(2, 'colour', 'Цвет')
+    pool.add(3, 'collar', 'воротник')
+    pool.add(4, 'cellar', 'подвал')
+    # 99 - похожее слово из чужого набора, 2 - вариант написания с тем же переводом
+    options = pool.wrong_options(1, 2, preferred=[99, 2, 3])
+    assert options[0] == 'collar'
+    assert set(options) == {'collar', 'cellar'}
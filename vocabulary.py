@@ -0,0 +1,221 @@
+import itertools
+import random
+import threading
+import time
+from array import array
+
+from cache import LoadLocks, TTLCache
+from scheduler import DEFAULT_EASE, SHOWN_DEFER, DueQueue, review
+
+# Версии пулов уникальны в пределах процесса, в том числе после перезагрузки пула
+_versions = itertools.count(1)
+
+
+def normalize(text):
+    """Без учета регистра и лишних пробелов"""
+    return ' '.join(text.split()).lower()
+
+
+def word_key(english_word, russian_translation):
+    """Нормализованный ключ пары слов в общем словаре"""
+    return f"{normalize(english_word)}|{normalize(russian_translation)}"
+
+
+class WordPool:
+    """Активные слова одного пользователя в компактном виде
+
+    ID слов лежат в плотном массиве, поэтому случайная карточка и варианты
+    ответа выбираются за O(1) по индексу. Удаление - перестановкой с последним
+    элементом, тоже за O(1). Очередь due упорядочивает слова по времени
+    следующего показа для интервальных повторений.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.positions = {}   # word_id -> индекс в self.ids
+        self.words = {}       # word_id -> (english_word, russian_translation)
+        self.by_english = {}  # normalize(english_word) -> word_id
+        self.schedules = {}   # word_id -> (ease, interval, repetitions)
+        self.due = DueQueue()
+        self.lock = threading.Lock()
+        self.version = next(_versions)  # меняется при каждом добавлении и удалении слова
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, word_id):
+        return word_id in self.positions
+
+    def add(self, word_id, english_word, russian_translation,
+            ease=DEFAULT_EASE, interval=0, repetitions=0, due_ts=0.0):
+        with self.lock:
+            if word_id in self.positions:
+                return
+            self.positions[word_id] = len(self.ids)
+            self.ids.append(word_id)
+            self.words[word_id] = (english_word, russian_translation)
+            self.by_english[normalize(english_word)] = word_id
+            self.schedules[word_id] = (ease, interval, repetitions)
+            # Новые слова (due_ts=0) идут в очередь первыми
+            self.due.push(word_id, due_ts)
+            self.version = next(_versions)
+
+    def remove(self, word_id):
+        with self.lock:
+            position = self.positions.pop(word_id, None)
+            if position is None:
+                return False
+
+            last_id = self.ids.pop()
+            if last_id != word_id:
+                self.ids[position] = last_id
+                self.positions[last_id] = position
+
+            english_word, _ = self.words.pop(word_id)
+            if self.by_english.get(normalize(english_word)) == word_id:
+                del self.by_english[normalize(english_word)]
+            self.schedules.pop(word_id, None)
+            self.due.discard(word_id)
+            self.version = next(_versions)
+            return True
+
+    def find(self, english_word):
+        """Возвращает word_id по английскому слову (без учета регистра и лишних пробелов)"""
+        return self.by_english.get(normalize(english_word))
+
+    def random_word(self):
+        """Возвращает случайное слово как словарь или None, если слов нет"""
+        with self.lock:
+            if not self.ids:
+                return None
+            word_id = self.ids[random.randrange(len(self.ids))]
+            english_word, russian_translation = self.words[word_id]
+        return {
+            'word_id': word_id,
+            'english_word': english_word,
+            'russian_translation': russian_translation
+        }
+
+    def next_due_word(self, now=None, defer=True):
+        """Возвращает слово с ближайшим временем показа или None, если слов нет
+
+        Показанная карточка отодвигается на SHOWN_DEFER секунд только в памяти,
+        чтобы кнопка "Дальше" без ответа не возвращала ту же карточку. Карточку,
+        которую только готовят заранее, не отодвигают (defer=False): это делает
+        mark_shown, когда ее действительно показали.
+        """
+        with self.lock:
+            top = self.due.peek()
+            if top is None:
+                return None
+            word_id = top[1]
+            if defer:
+                self._defer(word_id, now)
+            english_word, russian_translation = self.words[word_id]
+        return {
+            'word_id': word_id,
+            'english_word': english_word,
+            'russian_translation': russian_translation
+        }
+
+    def mark_shown(self, word_id, now=None):
+        """Отодвигает показанную карточку на SHOWN_DEFER секунд (см. next_due_word)"""
+        with self.lock:
+            self._defer(word_id, now)
+
+    def _defer(self, word_id, now):
+        due_ts = self.due.due_ts(word_id)
+        if due_ts is not None:
+            now = time.time() if now is None else now
+            self.due.push(word_id, max(due_ts, now) + SHOWN_DEFER)
+
+    def record_answer(self, word_id, correct, now=None, factor=1.0):
+        """Пересчитывает расписание слова, возвращает (ease, interval, repetitions, due_ts)"""
+        with self.lock:
+            if word_id not in self.positions:
+                return None
+            ease, interval, repetitions = self.schedules[word_id]
+            ease, interval, repetitions, due_ts = review(ease, interval, repetitions, correct, now, factor)
+            self.schedules[word_id] = (ease, interval, repetitions)
+            self.due.push(word_id, due_ts)
+        return ease, interval, repetitions, due_ts
+
+    def wrong_options(self, word_id, count, preferred=()):
+        """Возвращает до count английских слов, отличных от слова word_id
+
+        Сначала берутся слова из preferred (words.id похожих на правильный
+        ответ), но только те, что есть в этом пуле: чужие слова пользователям
+        не показываются. Недостающие варианты добираются случайными словами
+        пользователя. Слово с тем же переводом, что у правильного ответа
+        (color/colour), вариантом не становится - оно тоже было бы верным.
+        """
+        with self.lock:
+            target, translation = self.words.get(word_id, (None, None))
+            translation = normalize(translation) if translation else None
+            size = len(self.ids)
+            options = []
+            seen = {normalize(target)} if target else set()
+
+            def take(other_id):
+                english_word, russian_translation = self.words[other_id]
+                key = normalize(english_word)
+                if key not in seen and normalize(russian_translation) != translation:
+                    seen.add(key)
+                    options.append(english_word)
+
+            for other_id in preferred:
+                if len(options) >= count:
+                    return options
+                if other_id in self.words:
+                    take(other_id)
+
+            # Случайные позиции без сортировки таблицы; число попыток ограничено
+            for _ in range(count * 4):
+                if len(options) >= count:
+                    break
+                take(self.ids[random.randrange(size)])
+
+            # Для маленьких словарей добираем варианты полным проходом
+            if len(options) < count:
+                for other_id in self.ids:
+                    take(other_id)
+                    if len(options) >= count:
+                        break
+
+        return options
+
+
+class VocabularyCache:
+    """Кэш WordPool по users.id с инкрементальной инвалидацией"""
+
+    def __init__(self, maxsize=5000, ttl=1800):
+        self.pools = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._load_locks = LoadLocks()
+
+    def get_or_load(self, user_id, loader):
+        """Возвращает пул пользователя, при промахе строит его из строк loader(user_id)"""
+        pool = self.pools.get(user_id)
+        if pool is not None:
+            return pool
+
+        def load():
+            pool = WordPool()
+            for row in loader(user_id):
+                pool.add(*row)
+            self.pools.set(user_id, pool)
+            return pool
+
+        return self._load_locks.load(user_id, lambda: self.pools.get(user_id), load)
+
+    def word_added(self, user_id, word_id, english_word, russian_translation):
+        pool = self.pools.get(user_id)
+        if pool is not None:
+            pool.add(word_id, english_word, russian_translation)
+
+    def word_removed(self, user_id, word_id):
+        pool = self.pools.get(user_id)
+        if pool is not None:
+            pool.remove(word_id)
+
+    def invalidate(self, user_id):
+        self.pools.pop(user_id)
@@ -0,0 +1,172 @@
+import hmac
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY_SIZE = 1024 * 1024
+
+_STOP = object()
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server_version = 'BotWebhook/1.0'
+
+    def do_POST(self):
+        webhook = self.server.webhook
+        if self.path != webhook.path:
+            self._reply(404)
+            return
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), webhook.secret_token):
+            webhook._count('rejected')
+            self._reply(403)
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if not 0 < length <= MAX_BODY_SIZE:
+            self._reply(413 if length else 400)
+            return
+        try:
+            update = types.Update.de_json(json.loads(self.rfile.read(length)))
+        except Exception:
+            webhook._count('invalid')
+            self._reply(400)
+            return
+
+        # Отвечаем сразу; при переполненной очереди Telegram повторит доставку позже
+        self._reply(200 if webhook.enqueue(update) else 503)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _WebhookHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # очередь соединений ОС: при всплеске запросов Telegram не получает отказ
+
+
+class WebhookServer:
+    """Прием обновлений по вебхуку: HTTP-сервер + ограниченная очередь + пакетная обработка
+
+    HTTP-потоки только проверяют секрет, разбирают JSON и кладут обновление в
+    очередь, поэтому Telegram получает ответ сразу. Отдельный поток забирает
+    обновления пачками до batch_size (ожидая добор не дольше batch_wait секунд)
+    и передает их в bot.process_new_updates - при запущенном диспетчере они
+    расходятся по очередям чатов.
+    """
+
+    def __init__(self, bot, host='127.0.0.1', port=8443, path='/webhook', secret_token=None,
+                 queue_size=10000, batch_size=100, batch_wait=0.05):
+        # Без секрета любой, кто достучится до порта, прислал бы обновление от чужого имени (в том числе админа)
+        if not secret_token:
+            raise ValueError("Webhook requires a secret token (WEBHOOK_SECRET)")
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._httpd = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.overflow = 0
+        self.processed = 0
+        self.batches = 0
+
+    def _count(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def enqueue(self, update):
+        """Ставит обновление в очередь; False, если очередь заполнена"""
+        try:
+            self._queue.put_nowait(update)
+        except queue.Full:
+            self._count('overflow')
+            return False
+        self._count('received')
+        return True
+
+    def start(self):
+        """Запускает HTTP-сервер и поток обработки; возвращает фактический порт"""
+        if self._httpd is not None:
+            return self.port
+        self._httpd = _WebhookHTTPServer((self.host, self.port), _WebhookHandler)
+        self._httpd.webhook = self
+        self.port = self._httpd.server_address[1]
+
+        for target, name in ((self._httpd.serve_forever, 'WebhookHTTP'), (self._consume, 'WebhookConsumer')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self.port
+
+    def _consume(self):
+        while True:
+            update = self._queue.get()
+            if update is _STOP:
+                return
+
+            batch = [update]
+            deadline = time.monotonic() + self.batch_wait
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    update = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if update is _STOP:
+                    stop = True
+                    break
+                batch.append(update)
+
+            try:
+                self.bot.process_new_updates(batch)
+            except Exception as e:
+                print(f"Webhook batch processing error: {e}")
+            self._count('processed', len(batch))
+            self._count('batches')
+            if stop:
+                return
+
+    def stop(self, timeout=10.0):
+        """Перестает принимать запросы и дорабатывает уже принятые обновления"""
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        # Маркер встает в очередь после всех принятых обновлений
+        self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._httpd = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'received': self.received,
+                'rejected': self.rejected,
+                'invalid': self.invalid,
+                'overflow': self.overflow,
+                'processed': self.processed,
+                'batches': self.batches,
+                'queue_depth': self._queue.qsize(),
+            }
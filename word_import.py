@@ -0,0 +1,62 @@
+import csv
+import io
+
+MAX_WORD_LENGTH = 100  # как у колонок words.english_word и words.russian_translation
+DELIMITERS = '\t;,'
+HEADER_WORDS = {'english', 'english_word', 'word', 'en', 'слово', 'английский'}
+
+
+class ImportStats:
+    """Итоги разбора файла: сколько строк пропущено и почему"""
+    __slots__ = ('rows', 'invalid')
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid = 0
+
+
+def detect_delimiter(sample):
+    """Выбирает разделитель (TAB, ';' или ',') по первой непустой строке"""
+    first_line = next((line for line in sample.splitlines() if line.strip()), '')
+    counts = {delimiter: first_line.count(delimiter) for delimiter in DELIMITERS}
+    delimiter = max(counts, key=counts.get)
+    return delimiter if counts[delimiter] else ','
+
+
+def iter_word_pairs(stream, stats=None):
+    """Читает из текстового потока пары (английское слово, перевод) по одной строке
+
+    Файл не загружается в память целиком: строки разбираются по мере чтения.
+    Пустые строки, строки без перевода и слишком длинные значения пропускаются
+    (учитываются в stats.invalid), заголовок вида "english,russian" - тоже.
+    """
+    stats = stats or ImportStats()
+    sample = stream.read(4096)
+    delimiter = detect_delimiter(sample)
+    lines = io.StringIO(sample + stream.readline()) if len(sample) == 4096 else io.StringIO(sample)
+
+    def source():
+        yield from lines
+        yield from stream
+
+    for index, row in enumerate(csv.reader(source(), delimiter=delimiter)):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if index == 0 and row[0].strip().lower() in HEADER_WORDS:
+            continue
+
+        stats.rows += 1
+        if len(row) < 2:
+            stats.invalid += 1
+            continue
+        english_word, russian_translation = row[0].strip(), row[1].strip()
+        if (not english_word or not russian_translation
+                or len(english_word) > MAX_WORD_LENGTH or len(russian_translation) > MAX_WORD_LENGTH):
+            stats.invalid += 1
+            continue
+        yield english_word, russian_translation
+
+
+def open_upload(data):
+    """Текстовый поток поверх байтов загруженного файла (UTF-8, BOM допускается)"""
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', errors='replace', newline='')